@@ -0,0 +1,288 @@
+"""Local stand-in for the (Azure) OpenAI API used by extract_structured_info.
+
+Answers chat completions with a JSON object matching the requested schema
+after a configurable latency, rejects a configurable share of requests with
+429 and Retry-After like a saturated deployment, and runs Batch API jobs
+at submission. Requests containing ``failing_marker`` are answered with a
+server error, and a batch can be reported in progress for a number of polls.
+Token usage is estimated at four characters per token.
+"""
+
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+def fake_value(schema: Dict[str, Any]) -> Any:
+    """A placeholder value satisfying a JSON schema."""
+    schema_type = schema.get("type", "string")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "string")
+    if schema_type == "object":
+        return {
+            name: fake_value(field)
+            for name, field in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [fake_value(schema.get("items", {})) for _ in range(2)]
+    if schema_type == "integer":
+        return 2024
+    if schema_type == "number":
+        return 1.0
+    if schema_type == "boolean":
+        return True
+    return "synthetic value"
+
+
+SERVER_ERROR = {"error": {"code": "server_error", "message": "Injected failure"}}
+
+
+def _token_count(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible HTTP server running in a background thread.
+
+    Use as a context manager; ``url`` is the endpoint to configure the client
+    with. Counters of requests, 429s and tokens, and the latency of every
+    answered completion, are kept for the benchmark report.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 500,
+        jitter_ms: float = 200,
+        rate_limit_rate: float = 0.0,
+        retry_after_seconds: float = 1,
+        failing_marker: Optional[str] = None,
+        batch_in_progress_polls: int = 0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.failing_marker = failing_marker
+        self.batch_in_progress_polls = batch_in_progress_polls
+        self.requests = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: List[float] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self.batch_polls: Dict[str, int] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                fake._handle(self, "POST")
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completion answering ``request``, with estimated usage."""
+        response_format = request.get("response_format") or {}
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        content = json.dumps(fake_value(schema) if schema else {})
+        prompt_tokens = sum(
+            _token_count(str(message.get("content", "")))
+            for message in request.get("messages", [])
+        )
+        completion_tokens = _token_count(content)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        path = handler.path.split("?", 1)[0]
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+
+        if method == "POST" and path.endswith("/chat/completions"):
+            self._chat_completion(handler, json.loads(body))
+        elif method == "POST" and path.endswith("/files"):
+            self._create_file(handler, body)
+        elif method == "POST" and path.endswith("/batches"):
+            self._create_batch(handler, json.loads(body))
+        elif method == "GET" and (match := re.search(r"/batches/([^/]+)$", path)):
+            self._retrieve_batch(handler, match.group(1))
+        elif method == "GET" and (match := re.search(r"/files/([^/]+)/content$", path)):
+            self._send(handler, 200, self._files[match.group(1)])
+        else:
+            self._send(handler, 404, {"error": {"message": f"No route {path}"}})
+
+    def fails(self, request: Dict[str, Any]) -> bool:
+        return bool(self.failing_marker) and any(
+            self.failing_marker in str(message.get("content", ""))
+            for message in request.get("messages", [])
+        )
+
+    def _chat_completion(
+        self, handler: BaseHTTPRequestHandler, request: Dict[str, Any]
+    ) -> None:
+        if self.fails(request):
+            self._send(handler, 500, SERVER_ERROR)
+            return
+        with self._lock:
+            self.requests += 1
+            rejected = self._random.random() < self.rate_limit_rate
+            delay = max(
+                0.0, self.latency_ms + self._random.uniform(-1, 1) * self.jitter_ms
+            )
+        if rejected:
+            with self._lock:
+                self.rate_limited += 1
+            self._send(
+                handler,
+                429,
+                {"error": {"code": "429", "message": "Rate limit exceeded"}},
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+            return
+
+        started = time.perf_counter()
+        time.sleep(delay / 1000)
+        self._send(handler, 200, self.completion(request))
+        with self._lock:
+            self.latencies.append(time.perf_counter() - started)
+
+    def _create_file(self, handler: BaseHTTPRequestHandler, body: bytes) -> None:
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {handler.headers['Content-Type']}\r\n\r\n".encode()
+            + body
+        )
+        content = next(
+            part.get_payload(decode=True)
+            for part in message.iter_parts()
+            if part.get_param("name", header="content-disposition") == "file"
+        )
+        self._send(handler, 200, self._file(content, "batch"))
+
+    def _create_batch(
+        self, handler: BaseHTTPRequestHandler, request: Dict[str, Any]
+    ) -> None:
+        # Answered at once: the benchmark measures the pipeline, not the queue
+        lines = []
+        for line in self._files[request["input_file_id"]].decode().splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                response = (
+                    {"status_code": 500, "body": SERVER_ERROR}
+                    if self.fails(entry["body"])
+                    else {"status_code": 200, "body": self.completion(entry["body"])}
+                )
+                lines.append(
+                    json.dumps({"custom_id": entry["custom_id"], "response": response})
+                )
+        with self._lock:
+            self.requests += len(lines)
+        output = self._file("\n".join(lines).encode(), "batch_output")
+
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "status": "completed",
+            "output_file_id": output["id"],
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {
+                "total": len(lines),
+                "completed": len(lines),
+                "failed": 0,
+            },
+        }
+        self._batches[batch["id"]] = batch
+        self.batch_polls[batch["id"]] = 0
+        self._send(handler, 200, {**batch, "status": "validating"})
+
+    def _retrieve_batch(self, handler: BaseHTTPRequestHandler, batch_id: str) -> None:
+        with self._lock:
+            self.batch_polls[batch_id] += 1
+            polls = self.batch_polls[batch_id]
+        batch = self._batches[batch_id]
+        if polls <= self.batch_in_progress_polls:
+            batch = {**batch, "status": "in_progress", "output_file_id": None}
+        self._send(handler, 200, batch)
+
+    def _file(self, content: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex}"
+        self._files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl",
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    @staticmethod
+    def _send(
+        handler: BaseHTTPRequestHandler,
+        status: int,
+        payload: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
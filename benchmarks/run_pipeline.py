@@ -0,0 +1,227 @@
+"""End-to-end benchmark of document_processing_job on a synthetic corpus.
+
+Generates PDFs, points the Azure OpenAI client at a local fake server and
+materializes extract_pdf_text -> extract_structured_info -> load_to_database
+through the project's ``Definitions``, in runs of ``--docs-per-run``
+partitions like a backfill. Reports throughput, per-stage latency
+percentiles, peak RSS and token usage, optionally as JSON for comparing
+against a previous report:
+
+    python -m benchmarks.run_pipeline --documents 50 --pages 20 --output report.json
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.synthetic_corpus import generate_corpus
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 0.5), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "max": round(max(values, default=0.0), 3),
+    }
+
+
+def step_durations(instance, run_id: str) -> Dict[str, float]:
+    """Seconds from start to end of each step of a run, from its event log."""
+    started, durations = {}, {}
+    for entry in instance.all_logs(run_id):
+        event = entry.dagster_event
+        if event is None:
+            continue
+        if event.event_type_value == "STEP_START":
+            started[event.step_key] = entry.timestamp
+        elif event.event_type_value in ("STEP_SUCCESS", "STEP_FAILURE"):
+            durations[event.step_key] = entry.timestamp - started[event.step_key]
+    return durations
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="pipeline_benchmark_"))
+    data_dir = workdir / "data"
+    pdfs = generate_corpus(data_dir / "raw", args.documents, args.pages, args.seed)
+    partition_keys = [pdf.stem for pdf in pdfs]
+
+    with FakeOpenAIServer(
+        latency_ms=args.llm_latency_ms,
+        jitter_ms=args.llm_jitter_ms,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ) as llm:
+        # Read when the definitions are imported
+        os.environ.update(
+            DAGSTER_DEPLOYMENT="local",
+            LOCAL_STORAGE_PATH=str(data_dir),
+            DUCKDB_PATH=str(workdir / "benchmark.duckdb"),
+            AZURE_OPENAI_ENDPOINT=llm.url,
+            AZURE_OPENAI_API_KEY="benchmark",
+        )
+        import dagster as dg
+        from dagster._core.storage.tags import (
+            ASSET_PARTITION_RANGE_END_TAG,
+            ASSET_PARTITION_RANGE_START_TAG,
+        )
+
+        from src.definitions import defs
+
+        instance = dg.DagsterInstance.ephemeral()
+        instance.add_dynamic_partitions("documents", partition_keys)
+        job = defs.get_job_def("document_processing_job")
+        run_config = {
+            "ops": {
+                "extract_pdf_text": {"config": {"max_workers": args.workers}},
+                "extract_structured_info": {
+                    "config": {
+                        # Every run must reach the fake server
+                        "llm_cache_dir": None,
+                        "mode": args.mode.upper(),
+                        "batch_poll_interval_seconds": 0,
+                        "max_concurrent_requests": args.max_concurrent_requests,
+                        "requests_per_minute": args.requests_per_minute,
+                        "tokens_per_minute": args.tokens_per_minute,
+                    }
+                },
+            }
+        }
+
+        stage_seconds: Dict[str, List[float]] = defaultdict(list)
+        stage_seconds_per_document: Dict[str, List[float]] = defaultdict(list)
+        failed_runs = 0
+        started = time.perf_counter()
+        for first in range(0, len(partition_keys), args.docs_per_run):
+            keys = partition_keys[first : first + args.docs_per_run]
+            result = job.execute_in_process(
+                instance=instance,
+                run_config=run_config,
+                tags={
+                    ASSET_PARTITION_RANGE_START_TAG: keys[0],
+                    ASSET_PARTITION_RANGE_END_TAG: keys[-1],
+                },
+                raise_on_error=False,
+            )
+            failed_runs += not result.success
+            for step, seconds in step_durations(instance, result.run_id).items():
+                stage_seconds[step].append(seconds)
+                stage_seconds_per_document[step].append(seconds / len(keys))
+        elapsed = time.perf_counter() - started
+
+        import duckdb
+
+        # Same configuration as the resource's connection, which stays open
+        with duckdb.connect(os.environ["DUCKDB_PATH"]) as db:
+            try:
+                rows = db.execute("SELECT count(*) FROM documents").fetchone()[0]
+            except duckdb.CatalogException:
+                # No run got as far as loading
+                rows = 0
+
+    # ru_maxrss is in KiB on Linux; children are the extraction workers
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        "documents": args.documents,
+        "pages_per_document": args.pages,
+        "docs_per_run": args.docs_per_run,
+        "mode": args.mode,
+        "failed_runs": failed_runs,
+        "rows_loaded": rows,
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_per_second": round(args.documents / elapsed, 3),
+        "stage_seconds_per_run": {
+            step: summarize(values) for step, values in stage_seconds.items()
+        },
+        "stage_seconds_per_document": {
+            step: summarize(values)
+            for step, values in stage_seconds_per_document.items()
+        },
+        "llm": {
+            "requests": llm.requests,
+            "rate_limited": llm.rate_limited,
+            "prompt_tokens": llm.prompt_tokens,
+            "completion_tokens": llm.completion_tokens,
+            "latency_seconds": summarize(llm.latencies),
+        },
+        "peak_rss_mb": {
+            "main": round(self_rss, 1),
+            "largest_worker": round(children_rss, 1),
+        },
+        "workdir": str(workdir),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"{report['documents']} documents x {report['pages_per_document']} pages "
+        f"in {report['elapsed_seconds']}s: "
+        f"{report['documents_per_second']} docs/sec, {report['rows_loaded']} rows "
+        f"loaded, {report['failed_runs']} failed run(s)"
+    )
+    print(f"{'stage':<28}{'p50 s/doc':>12}{'p95 s/doc':>12}{'max s/run':>12}")
+    for step, seconds in report["stage_seconds_per_document"].items():
+        print(
+            f"{step:<28}{seconds['p50']:>12}{seconds['p95']:>12}"
+            f"{report['stage_seconds_per_run'][step]['max']:>12}"
+        )
+    llm = report["llm"]
+    print(
+        f"LLM: {llm['requests']} requests ({llm['rate_limited']} rate limited), "
+        f"{llm['prompt_tokens']} prompt + {llm['completion_tokens']} completion "
+        f"tokens, latency p50 {llm['latency_seconds']['p50']}s "
+        f"p95 {llm['latency_seconds']['p95']}s"
+    )
+    rss = report["peak_rss_mb"]
+    print(f"Peak RSS: {rss['main']} MB main, {rss['largest_worker']} MB worker")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--docs-per-run", type=int, default=10)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="extraction processes"
+    )
+    parser.add_argument("--mode", choices=["online", "batch"], default="online")
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="share of completions answered with 429",
+    )
+    parser.add_argument("--max-concurrent-requests", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=int, default=600)
+    parser.add_argument("--tokens-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="defaults to a new temporary directory")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
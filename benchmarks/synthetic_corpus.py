@@ -0,0 +1,107 @@
+"""Synthetic PDF corpus with a text layer, for benchmarking the pipeline."""
+
+import random
+from pathlib import Path
+from typing import List
+
+WORDS = (
+    "attention model transformer layer network training data results method "
+    "encoder decoder sequence token embedding loss gradient optimization "
+    "benchmark evaluation accuracy baseline dataset experiment parameter "
+    "architecture performance analysis approach proposed learning task"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LINES_PER_PAGE = 50
+WORDS_PER_LINE = 12
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: List[str]) -> bytes:
+    # Helvetica 10pt, one line every 14pt from the top margin
+    operations = ["BT", "/F1 10 Tf", "14 TL", f"50 {PAGE_HEIGHT - 60} Td"]
+    for line in lines:
+        operations.append(f"({_escape(line)}) Tj T*")
+    operations.append("ET")
+    return "\n".join(operations).encode("latin-1")
+
+
+def write_pdf(path: Path, page_count: int, rng: random.Random) -> None:
+    """Write a PDF of ``page_count`` pages of random words.
+
+    The first page opens with a title, an author line and an abstract, and
+    the last one with a conclusion, so the LLM stage sees a paper-like text.
+    """
+    pages = []
+    for page in range(page_count):
+        lines = [
+            " ".join(rng.choices(WORDS, k=WORDS_PER_LINE))
+            for _ in range(LINES_PER_PAGE)
+        ]
+        if page == 0:
+            lines[:4] = [
+                f"Synthetic Paper {path.stem}",
+                "Ada Lovelace, Alan Turing",
+                "",
+                "Abstract",
+            ]
+        if page == page_count - 1:
+            lines[-12] = "Conclusions"
+        pages.append(_page_stream(lines))
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids ["
+            + " ".join(f"{4 + 2 * index} 0 R" for index in range(page_count))
+            + f"] /Count {page_count} >>"
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for index, stream in enumerate(pages):
+        objects.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} "
+                f"{PAGE_HEIGHT}] /Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {5 + 2 * index} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode()
+            + stream
+            + b"\nendstream"
+        )
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        data += f"{offset:010d} 00000 n \n".encode()
+    data += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(data))
+
+
+def generate_corpus(
+    folder: Path, document_count: int, page_count: int, seed: int = 0
+) -> List[Path]:
+    """Write ``document_count`` PDFs of ``page_count`` pages into ``folder``."""
+    rng = random.Random(seed)
+    paths = []
+    for index in range(document_count):
+        path = folder / f"synthetic-{index:05d}.pdf"
+        write_pdf(path, page_count, rng)
+        paths.append(path)
+    return paths
@@ -1,41 +1,139 @@
 from dagster import (
     asset,
     Output,
-    MetadataValue,
     get_dagster_logger,
     Config,
     AssetExecutionContext,
 )
-from typing import Dict, Any
-from pathlib import Path
-import uuid
-from unstructured.partition.pdf import partition_pdf
-from datetime import datetime
-import json
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set
+from pathlib import PurePosixPath
 
+from src.partitions import documents_backfill_policy, documents_partitions
 from src.resources.storage import StorageResource
-from src.types.documents import ExtractedDocument, DocumentType
+from src.services.pdf_extraction import (
+    ExtractionStrategy,
+    extract_pdfs,
+    resolve_worker_count,
+)
+from src.services.prefetch import PDFPrefetcher
+from src.utils import metrics
+from src.utils.manifest import ExtractionManifest
+from src.utils.metrics import collect_metrics
+from src.utils.serialization import OutputFormat
+from src.types.documents import DocumentReference
+from src.types.storage import FileInfo
 
 logger = get_dagster_logger()
 
+# Run tag holding the path of the PDF a single-document run extracts
+DOCUMENT_PATH_TAG = "document_path"
+
 
 class PDFExtractionConfig(Config):
     input_folder: str = "raw"
     output_folder: str = "s1_extract_pdf_text"
     batch_size: int = 10
+    # Worker processes for partitioning; None uses every available core
+    max_workers: Optional[int] = None
+    # TIERED reads the text layer and OCRs only pages with fewer than
+    # min_chars_per_page characters, using ocr_strategy (an unstructured
+    # strategy); the other values run that unstructured strategy on every page
+    strategy: ExtractionStrategy = ExtractionStrategy.TIERED
+    min_chars_per_page: int = 50
+    ocr_strategy: str = "hi_res"
+    # PDFs with more pages are split into ranges of this many pages, extracted
+    # in parallel and streamed to their output; 0 extracts every file whole
+    pages_per_task: int = 50
+    # Skip PDFs whose content is unchanged since their JSON was written
+    incremental: bool = True
+    # Sub-folder of output_folder holding one manifest entry per source file
+    manifest_folder: str = "_extraction_manifest"
+    # Format of the extracted documents: JSON, JSON_GZ, JSON_ZST or MSGPACK
+    output_format: OutputFormat = OutputFormat.JSON
+    # PDFs downloaded ahead of extraction when reading from S3
+    prefetch_count: int = 4
+
+
+def _record_extraction(metadata: Dict[str, Any]) -> None:
+    """Record the worker-side extraction time of a document, also per page."""
+    seconds = metadata["extraction_seconds"]
+    metrics.record("pdf_extraction", seconds)
+    page_count = metadata.get("page_count")
+    if page_count:
+        metrics.record("pdf_extraction_per_page", seconds / page_count)
+        metrics.increment("pdf_pages", page_count)
 
 
 @asset(
     compute_kind="pdf_extraction",
     group_name="documents",
-    code_version="v1",
+    code_version="v2",
+    partitions_def=documents_partitions,
+    backfill_policy=documents_backfill_policy,
+    io_manager_key="document_reference_io_manager",
 )
 def extract_pdf_text(
     context: AssetExecutionContext,
     config: PDFExtractionConfig,
     storage: StorageResource,
-) -> Output[Dict[str, Dict[str, str]]]:
-    """Extract text from PDF files."""
+) -> Output[Dict[str, DocumentReference]]:
+    """Extract text from the PDF files of the selected document partitions.
+
+    Returns references to the extracted JSON files, keyed by partition key.
+    """
+    with collect_metrics() as run_metrics:
+        output = _extract_pdf_text(context, config, storage)
+    return output.with_metadata({**output.metadata, **run_metrics.to_metadata()})
+
+
+def _find_pdfs(
+    context: AssetExecutionContext,
+    config: PDFExtractionConfig,
+    storage: StorageResource,
+    partition_keys: Set[str],
+) -> List[FileInfo]:
+    """The PDF of each partition, looked up directly where possible.
+
+    Runs requested by the sensor are tagged with their PDF's path, and PDFs at
+    the top of the input folder are found by name. Only the partitions left
+    need a listing of the whole input folder.
+    """
+    paths = [f"{config.input_folder}/{key}.pdf" for key in sorted(partition_keys)]
+    tagged = context.run.tags.get(DOCUMENT_PATH_TAG)
+    if tagged and PurePosixPath(tagged).stem in partition_keys:
+        paths.insert(0, tagged)
+    found: Dict[str, FileInfo] = {}
+    for path in paths:
+        stem = PurePosixPath(path).stem
+        if stem not in found:
+            info = storage.get_file_info(path)
+            if info is not None:
+                found[stem] = info
+
+    remaining = partition_keys - set(found)
+    if remaining:
+        context.log.info(f"Listing {config.input_folder} for {sorted(remaining)}")
+        listed = [
+            info
+            for info in storage.iter_files(config.input_folder, ".pdf")
+            if PurePosixPath(info.path).stem in remaining
+        ]
+        # Partitions are keyed by stem: never merge PDFs of different folders
+        stems = Counter(PurePosixPath(info.path).stem for info in listed)
+        for stem in sorted(stem for stem, count in stems.items() if count > 1):
+            context.log.error(f"Skipping PDFs sharing the document key {stem}")
+        for info in listed:
+            if stems[PurePosixPath(info.path).stem] == 1:
+                found[PurePosixPath(info.path).stem] = info
+    return [found[key] for key in sorted(found)]
+
+
+def _extract_pdf_text(
+    context: AssetExecutionContext,
+    config: PDFExtractionConfig,
+    storage: StorageResource,
+) -> Output[Dict[str, DocumentReference]]:
     context.log.info("Starting PDF text extraction")
 
     input_path = storage.get_full_path(config.input_folder)
@@ -43,54 +141,138 @@ def extract_pdf_text(
     context.log.info(f"Looking for PDFs in: {input_path}")
     context.log.info(f"Will save JSONs in: {output_path}")
 
-    # Ensure output directory exists
-    Path(output_path).mkdir(parents=True, exist_ok=True)
-
-    pdf_files = list(Path(input_path).glob("**/*.pdf"))
-    context.log.info(f"Found {len(pdf_files)} PDF files: {[f.name for f in pdf_files]}")
+    partition_keys = set(context.partition_keys)
+    pdf_files = _find_pdfs(context, config, storage, partition_keys)
+    context.log.info(
+        f"Found {len(pdf_files)} PDF files: "
+        f"{[PurePosixPath(info.path).name for info in pdf_files]}"
+    )
 
     if not pdf_files:
-        context.log.warning(f"No PDF files found in {input_path}")
+        context.log.warning(
+            f"No PDF files found in {input_path} "
+            f"for partitions {sorted(partition_keys)}"
+        )
         return Output(value={}, metadata={"files_processed": 0})
 
     extracted_texts = {}
+    manifest = ExtractionManifest(
+        storage,
+        f"{config.output_folder}/{config.manifest_folder}",
+        # A file extracted differently, or by other code, is extracted again
+        settings={
+            "code_version": context.assets_def.code_versions_by_key[
+                context.asset_key
+            ],
+            "strategy": config.strategy.value,
+            "min_chars_per_page": config.min_chars_per_page,
+            "ocr_strategy": config.ocr_strategy,
+            "pages_per_task": config.pages_per_task,
+            "output_format": config.output_format.value,
+        },
+    )
+
+    def manifest_key(info: FileInfo) -> str:
+        return str(PurePosixPath(info.path).relative_to(config.input_folder))
 
-    for pdf_file in pdf_files:
-        try:
-            context.log.info(f"Processing {pdf_file.name}")
-            elements = partition_pdf(filename=str(pdf_file))
-            text_content = "\n".join([str(el) for el in elements])
-
-            doc_id = str(uuid.uuid4())
-            doc_data = {
-                "filename": str(pdf_file.name),
-                "content": text_content,
-                "extraction_date": datetime.now().isoformat(),
-            }
-
-            # Save to JSON file with same name as PDF
-            json_path = Path(output_path) / f"{pdf_file.stem}.json"
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(doc_data, f, ensure_ascii=False, indent=2)
-
-            extracted_texts[doc_id] = doc_data
-            context.log.info(
-                f"Successfully processed {pdf_file.name} and saved to {json_path}"
+    to_extract = []
+    for info in pdf_files:
+        entry = manifest.get(manifest_key(info))
+        if (
+            config.incremental
+            and entry
+            and entry.get("reference")
+            and storage.exists(entry["reference"]["path"])
+            and manifest.is_unchanged(
+                manifest_key(info), info, storage.get_local_path(info.path)
             )
+        ):
+            extracted_texts[PurePosixPath(info.path).stem] = DocumentReference(
+                **entry["reference"]
+            )
+        else:
+            to_extract.append(info)
+
+    files_skipped = len(extracted_texts)
+    context.log.info(
+        f"{files_skipped} PDF(s) unchanged since last run, {len(to_extract)} to extract"
+    )
+
+    max_workers = resolve_worker_count(
+        config.max_workers, len(to_extract), split_pages=config.pages_per_task > 0
+    )
+    context.log.info(
+        f"Extracting with up to {max_workers} worker(s), "
+        f"batch size {config.batch_size}, "
+        f"prefetching {config.prefetch_count} file(s) ahead"
+    )
+
+    # Number of newly extracted documents per strategy actually used
+    strategies: Dict[str, int] = {}
+    with PDFPrefetcher(storage, to_extract, config.prefetch_count) as prefetcher:
+        for pdf_file, doc_data, error in extract_pdfs(
+            prefetcher,
+            max_workers,
+            config.batch_size,
+            strategy=config.strategy,
+            min_chars_per_page=config.min_chars_per_page,
+            ocr_strategy=config.ocr_strategy,
+            pages_per_task=config.pages_per_task or None,
+        ):
+            info = prefetcher.source(pdf_file)
+            try:
+                if error is not None:
+                    raise error
+
+                # Save with the same name as the PDF
+                output_file = (
+                    f"{config.output_folder}/{pdf_file.stem}"
+                    f"{config.output_format.suffix}"
+                )
+                # Split PDFs hand over their content in chunks
+                sha256, size_bytes = storage.write_json(
+                    output_file, doc_data, streamed_keys=("content",)
+                )
+
+                reference = DocumentReference(
+                    filename=doc_data["filename"],
+                    path=output_file,
+                    sha256=sha256,
+                    size_bytes=size_bytes,
+                    extraction_date=doc_data["extraction_date"],
+                )
+                manifest.record(
+                    manifest_key(info), info, pdf_file, reference.model_dump()
+                )
+                extracted_texts[pdf_file.stem] = reference
+                strategy = doc_data["metadata"]["strategy"]
+                strategies[strategy] = strategies.get(strategy, 0) + 1
+                _record_extraction(doc_data["metadata"])
+                context.log.info(
+                    f"Successfully processed {pdf_file.name} ({strategy}) and "
+                    f"saved to {output_file}"
+                )
+
+            except Exception as e:
+                context.log.error(f"Error processing {pdf_file.name}: {str(e)}")
+                context.log.exception("Full error:")
+            finally:
+                prefetcher.release(pdf_file)
 
-        except Exception as e:
-            context.log.error(f"Error processing {pdf_file.name}: {str(e)}")
-            context.log.exception("Full error:")
-            continue
+        for info, error in prefetcher.errors:
+            context.log.error(f"Error downloading {info.path}: {str(error)}")
 
     return Output(
         value=extracted_texts,
         metadata={
             "files_processed": len(extracted_texts),
+            "files_skipped": files_skipped,
             "total_files": len(pdf_files),
             "success_rate": f"{(len(extracted_texts)/len(pdf_files))*100:.2f}%",
             "input_path": input_path,
             "output_path": output_path,
-            "processed_files": [f.name for f in pdf_files],
+            "processed_files": [PurePosixPath(info.path).name for info in pdf_files],
+            "max_workers": max_workers,
+            "strategies": strategies,
         },
     )
@@ -1,79 +1,321 @@
 # src/assets/s2_structured_info.py
-import dagster as dg
-from typing import Dict, Any
-from datetime import datetime
+import asyncio
+import hashlib
 import json
+import dagster as dg
+from typing import Dict, Any, Iterator, Optional, Tuple
+from enum import Enum
 from pathlib import Path
 
-from services.structured_output_processor import process_content
-
+from src.partitions import documents_backfill_policy, documents_partitions
 from src.resources.storage import StorageResource
+from src.services.batch_processor import BatchLLMProcessor
+from src.services.structured_output_processor import (
+    build_llm_processor,
+    process_content,
+)
+from src.types.documents import DocumentReference
+from src.utils import metrics
+from src.utils.checkpoint import ResultCheckpoint
 from src.utils.config_loader import load_prompt_config
+from src.utils.metrics import collect_metrics
+from src.utils.near_duplicates import NearDuplicateIndex
+from src.utils.serialization import OutputFormat
 
 logger = dg.get_dagster_logger()
 
 
+class ExtractionMode(str, Enum):
+    ONLINE = "online"
+    BATCH = "batch"
+
+
 class ExtractionConfig(dg.Config):
     input_folder: str = "s1_extract_pdf_text"
     output_folder: str = "s2_structured_info"
+    # Format of the structured documents: JSON, JSON_GZ, JSON_ZST or MSGPACK
+    output_format: OutputFormat = OutputFormat.JSON
+    # Azure OpenAI deployment budget shared by all documents of the run
+    max_concurrent_requests: int = 8
+    requests_per_minute: int = 60
+    tokens_per_minute: int = 90000
+    # Local response cache so identical reruns cost no tokens; None disables it
+    llm_cache_dir: Optional[str] = ".cache/llm_responses"
+    llm_cache_max_mb: int = 1024
+    # "batch" submits every request through the (cheaper, slower) Batch API
+    mode: ExtractionMode = ExtractionMode.ONLINE
+    batch_poll_interval_seconds: int = 60
+    batch_completion_window: str = "24h"
+    # Request the field groups from the prompt config separately and merge them
+    use_field_groups: bool = False
+    # Reuse the structured result of a processed document whose text is at least
+    # this similar (estimated Jaccard of word 5-grams) instead of calling the
+    # LLM; None disables the check
+    near_duplicate_threshold: Optional[float] = 0.9
+    # Sub-folder of output_folder holding the index, one file per document
+    near_duplicate_index: str = "_near_duplicate_index"
+    # Retries of a throttled or failed LLM request before its document fails
+    max_retries: int = 6
+    # Skip documents whose result an earlier (e.g. interrupted) run already
+    # wrote from the same extracted text and prompt
+    resume: bool = True
+    # Sub-folder of output_folder holding one checkpoint entry per document
+    checkpoint_folder: str = "_checkpoint"
 
 
 @dg.asset(
     group_name="reports",
     compute_kind="openai",
     deps=["extract_pdf_text"],
-    code_version="v1",
+    code_version="v2",
+    partitions_def=documents_partitions,
+    backfill_policy=documents_backfill_policy,
+    io_manager_key="document_reference_io_manager",
 )
 async def extract_structured_info(
     context: dg.AssetExecutionContext,
     config: ExtractionConfig,
     storage: StorageResource,
-    extract_pdf_text: Dict[str, Dict[str, str]],
-) -> dg.Output[Dict[str, Dict]]:
+    extract_pdf_text: Dict[str, DocumentReference],
+) -> dg.Output[Dict[str, DocumentReference]]:
+    with collect_metrics() as run_metrics:
+        output = await _extract_structured_info(
+            context, config, storage, extract_pdf_text
+        )
+    return output.with_metadata({**output.metadata, **run_metrics.to_metadata()})
+
+
+async def _extract_structured_info(
+    context: dg.AssetExecutionContext,
+    config: ExtractionConfig,
+    storage: StorageResource,
+    extract_pdf_text: Dict[str, DocumentReference],
+) -> dg.Output[Dict[str, DocumentReference]]:
     context.log.info("Starting data extraction")
 
     output_path = storage.get_full_path(config.output_folder)
-    Path(output_path).mkdir(parents=True, exist_ok=True)
 
-    config = load_prompt_config("s2_structured_info")
-    llm_config = config.get("paper_information_extraction")
+    prompt_config = load_prompt_config("s2_structured_info")
+    llm_config = prompt_config.get("paper_information_extraction")
 
-    structured_documents = {}
+    llm_processor = build_llm_processor(
+        llm_config,
+        max_concurrent_requests=config.max_concurrent_requests,
+        requests_per_minute=config.requests_per_minute,
+        tokens_per_minute=config.tokens_per_minute,
+        cache_dir=config.llm_cache_dir,
+        cache_max_bytes=config.llm_cache_max_mb * 1024 * 1024,
+        max_retries=config.max_retries,
+    )
 
-    for doc_id, doc_data in extract_pdf_text.items():
-        try:
+    def output_file(ref: DocumentReference) -> str:
+        stem = Path(ref.filename).stem
+        return f"{config.output_folder}/{stem}_structured{config.output_format.suffix}"
 
-            doc_id = doc_data["filename"]
+    # Results are only reused between runs of the same prompt and model
+    config_key = hashlib.sha256(
+        json.dumps(
+            [llm_config, config.use_field_groups], sort_keys=True, default=str
+        ).encode("utf-8")
+    ).hexdigest()
 
-            content_text = doc_data["content"]
+    # Documents finished by an earlier run, by partition key
+    resumed: Dict[str, DocumentReference] = {}
+    checkpoint = None
+    if config.resume:
+        checkpoint = ResultCheckpoint(
+            storage, f"{config.output_folder}/{config.checkpoint_folder}"
+        )
+        references = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    checkpoint.get, ref.filename, ref.sha256, config_key
+                )
+                for ref in extract_pdf_text.values()
+            )
+        )
+        for key, reference in zip(extract_pdf_text, references):
+            if reference:
+                resumed[key] = DocumentReference(**reference)
+        context.log.info(
+            f"{len(resumed)} document(s) already processed by an earlier run"
+        )
+    pending = {
+        key: ref for key, ref in extract_pdf_text.items() if key not in resumed
+    }
 
-            json_data = await process_content(doc_id, content_text, llm_config)
+    # Documents to reuse the result of, by partition key: (source, result path)
+    near_duplicates: Dict[str, Tuple[str, str]] = {}
+    index = None
+    if config.near_duplicate_threshold is not None:
+        index = NearDuplicateIndex(
+            storage,
+            f"{config.output_folder}/{config.near_duplicate_index}",
+            threshold=config.near_duplicate_threshold,
+        )
+        loading_signatures = asyncio.Semaphore(config.max_concurrent_requests)
 
-            json_path = Path(output_path) / f"{Path(doc_id).stem}_structured.json"
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+        async def signature(ref: DocumentReference):
+            async with loading_signatures:
+                doc_data = await asyncio.to_thread(storage.read_json, ref.path)
+                return await asyncio.to_thread(index.signature, doc_data["content"])
 
-            structured_documents[doc_id] = {
-                "filename": doc_id,
-                "extraction_date": doc_data["extraction_date"],
-                "json_data": json_data,
-            }
+        signatures = await asyncio.gather(
+            *(signature(ref) for ref in extract_pdf_text.values()),
+            return_exceptions=True,
+        )
+        # In order, so a duplicate within the run reuses the first of its copies
+        for (key, ref), doc_signature in zip(extract_pdf_text.items(), signatures):
+            if doc_signature is None or isinstance(doc_signature, Exception):
+                continue
+            # Resumed documents are only indexed, their result already exists
+            match = (
+                None
+                if key in resumed
+                else await asyncio.to_thread(
+                    index.query, doc_signature, config_key, exclude=ref.filename
+                )
+            )
+            if match:
+                source, result_path, similarity = match
+                near_duplicates[key] = (source, result_path)
+                context.log.info(
+                    f"{ref.filename} is a near-duplicate of {source} "
+                    f"(similarity {similarity:.2f}), reusing its result"
+                )
+            index.add(ref.filename, doc_signature, output_file(ref), config_key)
+        context.log.info(
+            f"{len(near_duplicates)} near-duplicate(s) found among "
+            f"{len(extract_pdf_text)} document(s)"
+        )
 
-        except Exception as e:
-            context.log.error(
-                f"Error processing report {doc_data['filename']}: {str(e)}"
+    def load_contents() -> Iterator[Tuple[str, str]]:
+        # Read one document at a time so the batch input is streamed to disk
+        for key, ref in pending.items():
+            if key in near_duplicates:
+                continue
+            try:
+                yield ref.filename, storage.read_json(ref.path)["content"]
+            except Exception as e:
+                context.log.error(f"Error loading {ref.path}: {str(e)}")
+
+    if config.mode == ExtractionMode.BATCH:
+        batch_processor = BatchLLMProcessor(
+            llm_processor,
+            poll_interval_seconds=config.batch_poll_interval_seconds,
+            completion_window=config.batch_completion_window,
+        )
+        batch_results = await batch_processor.extract_all(
+            load_contents(), use_field_groups=config.use_field_groups
+        )
+
+    # Bounds how many document texts are held in memory at once
+    loading = asyncio.Semaphore(config.max_concurrent_requests)
+
+    async def extract(key: str, ref: DocumentReference) -> Dict[str, Any]:
+        if key in near_duplicates:
+            return await asyncio.to_thread(storage.read_json, near_duplicates[key][1])
+        if config.mode == ExtractionMode.BATCH:
+            result = batch_results.get(ref.filename)
+            if result is None:
+                raise RuntimeError("Document was not part of the batch")
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async with loading:
+            doc_data = await asyncio.to_thread(storage.read_json, ref.path)
+            return await process_content(
+                ref.filename,
+                doc_data["content"],
+                llm_processor,
+                config.use_field_groups,
+            )
+
+    async def process_document(
+        key: str, ref: DocumentReference
+    ) -> Optional[Tuple[str, DocumentReference]]:
+        try:
+            with metrics.timed("document_structuring", document=ref.filename):
+                json_data = await extract(key, ref)
+            sha256, size_bytes = await asyncio.to_thread(
+                storage.write_json, output_file(ref), json_data
+            )
+
+            reference = DocumentReference(
+                filename=ref.filename,
+                path=output_file(ref),
+                sha256=sha256,
+                size_bytes=size_bytes,
+                extraction_date=ref.extraction_date,
             )
-            continue
+            if checkpoint is not None:
+                await asyncio.to_thread(
+                    checkpoint.record,
+                    ref.filename,
+                    ref.sha256,
+                    config_key,
+                    reference.model_dump(),
+                )
+            return key, reference
+
+        except Exception as e:
+            context.log.error(f"Error processing report {ref.filename}: {str(e)}")
+            return None
+
+    # Documents are processed concurrently; LLMProcessor enforces the budget.
+    # Near-duplicates come last as they may reuse a result of this run
+    results = await asyncio.gather(
+        *(
+            process_document(key, ref)
+            for key, ref in pending.items()
+            if key not in near_duplicates
+        )
+    )
+    results += await asyncio.gather(
+        *(
+            process_document(key, ref)
+            for key, ref in pending.items()
+            if key in near_duplicates
+        )
+    )
+    structured_documents = {**resumed, **dict(result for result in results if result)}
+
+    failed = [
+        ref.filename
+        for key, ref in extract_pdf_text.items()
+        if key not in structured_documents
+    ]
+    if failed:
+        context.log.warning(
+            f"{len(failed)} document(s) failed and can be retried by rerunning "
+            f"their partitions: {failed}"
+        )
+
+    if index is not None:
+        # Only documents with a result can be reused later
+        for key, ref in extract_pdf_text.items():
+            if key not in structured_documents:
+                index.remove(ref.filename)
+        await asyncio.to_thread(index.save)
 
     return dg.Output(
         value=structured_documents,
         metadata={
             "documents_processed": len(structured_documents),
+            "documents_resumed": len(resumed),
+            "documents_failed": failed,
             "success_rate": (
                 f"{(len(structured_documents)/len(extract_pdf_text))*100:.2f}%"
                 if extract_pdf_text
                 else "0%"
             ),
             "output_path": output_path,
+            "mode": config.mode.value,
+            "llm_cache_hits": llm_processor.cache.hits if llm_processor.cache else 0,
+            "near_duplicates": {
+                extract_pdf_text[key].filename: source
+                for key, (source, _) in near_duplicates.items()
+            },
         },
     )
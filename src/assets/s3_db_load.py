@@ -1,15 +1,57 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Dict, Optional
 import json
 from datetime import datetime
+from enum import Enum
 
 import dagster as dg
+import pyarrow as pa
 from dagster import MetadataValue
-from resources import duckdb
+
+from src.partitions import documents_backfill_policy, documents_partitions
+from src.types.documents import DocumentReference
+from src.utils.metrics import collect_metrics
+
+
+# Arrow types of the staged Parquet columns; other DuckDB types are staged as
+# strings (JSON columns hold serialized JSON)
+ARROW_TYPES = {
+    "INTEGER": pa.int32(),
+    "BIGINT": pa.int64(),
+    "DOUBLE": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+}
+
+
+def arrow_schema(schema_mapping: Dict[str, str]) -> pa.Schema:
+    """Arrow schema matching a DuckDB column mapping."""
+    return pa.schema(
+        [
+            (column, ARROW_TYPES.get(column_type.upper(), pa.string()))
+            for column, column_type in schema_mapping.items()
+        ]
+    )
+
+
+class LoadMode(str, Enum):
+    INCREMENTAL = "incremental"
+    FULL = "full"
 
 
 class DuckDBStorageConfig(dg.Config):
     table_name: str = "documents"
+    # "incremental" upserts this run's documents by document_id; "full" drops
+    # and recreates the table before loading them
+    load_mode: LoadMode = LoadMode.INCREMENTAL
+    # Each run's rows are staged as Parquet under this folder of the storage
+    # resource before loading; None loads them directly
+    staging_folder: Optional[str] = "s3_staging"
+    # Refresh the author/keyword/model side tables used by
+    # DuckDBResource.search_documents for this run's documents after each load
+    search_index: bool = True
+    # Also rebuild the full-text index, which reindexes the whole table; it is
+    # otherwise rebuilt by search_index_job
+    full_text_index: bool = False
+    # Columns added here are added to an existing table on the next load
     schema_mapping: Dict[str, str] = {
         "document_id": "VARCHAR",
         "filename": "VARCHAR",
@@ -32,47 +74,64 @@ class DuckDBStorageConfig(dg.Config):
     compute_kind="duckdb",
     group_name="load_to_database",
     deps=["extract_structured_info"],
-    code_version="v1",
-    required_resource_keys={"duckdb"},
+    code_version="v2",
+    required_resource_keys={"duckdb", "storage"},
+    partitions_def=documents_partitions,
+    backfill_policy=documents_backfill_policy,
+    # DuckDB allows a single writer process: serialize loads across runs
+    pool="duckdb",
 )
 def load_to_database(
     context: dg.AssetExecutionContext,
     config: DuckDBStorageConfig,
-    extract_structured_info: Dict[str, Dict],
-) -> dg.Output[Dict[str, Any]]:
+    extract_structured_info: Dict[str, DocumentReference],
+) -> dg.MaterializeResult:
     """Load structured data into DuckDB database."""
+    with collect_metrics() as run_metrics:
+        result = _load_to_database(context, config, extract_structured_info)
+    return dg.MaterializeResult(
+        metadata={**result.metadata, **run_metrics.to_metadata()}
+    )
+
+
+def _load_to_database(
+    context: dg.AssetExecutionContext,
+    config: DuckDBStorageConfig,
+    extract_structured_info: Dict[str, DocumentReference],
+) -> dg.MaterializeResult:
     context.log.info("Starting database load")
 
     try:
         # Get duckdb resource from context
         duckdb_resource = context.resources.duckdb
+        storage = context.resources.storage
 
-        # Create table if not exists
-        duckdb_resource.create_table(config.table_name, config.schema_mapping)
+        columns_added = []
+        if config.load_mode == LoadMode.FULL:
+            duckdb_resource.create_table(
+                config.table_name, config.schema_mapping, primary_key="document_id"
+            )
+        else:
+            columns_added = duckdb_resource.ensure_table(
+                config.table_name, config.schema_mapping, primary_key="document_id"
+            )
 
         # Prepare records for insertion
         records = []
-        for doc_id, doc_data in extract_structured_info.items():
-            # Extract the extraction_date from doc_data
-            extraction_date = (
-                doc_data.pop("extraction_date")
-                if "extraction_date" in doc_data
-                else None
-            )
-
-            # Extract the json_data from doc_data
-            json_data = doc_data.pop("json_data") if "json_data" in doc_data else {}
+        for ref in extract_structured_info.values():
+            # Load the structured data the reference points to
+            json_data = storage.read_json(ref.path)
 
             # Create metadata JSON
             metadata = {
-                "extraction_date": extraction_date,
+                "extraction_date": ref.extraction_date,
                 "processing_date": datetime.now().isoformat(),
             }
 
             # Create the record with flattened json_data fields
             record = {
-                "document_id": doc_id,
-                "filename": doc_data.get("filename", ""),
+                "document_id": ref.filename,
+                "filename": ref.filename,
                 "title": json_data.get("title", ""),
                 "authors": json.dumps(json_data.get("authors", [])),
                 "abstract": json_data.get("abstract", ""),
@@ -87,21 +146,26 @@ def load_to_database(
             records.append(record)
 
         # Insert records
+        staging_path = None
         if records:
-            # Build parameters for batch insert
-            columns = config.schema_mapping.keys()
-            insert_query = f"""
-                INSERT INTO {config.table_name} 
-                ({', '.join(columns)})
-                VALUES ({', '.join(['?'] * len(columns))})
-            """
-
-            rows_inserted = duckdb_resource.execute_batch(
-                insert_query, [[record.get(k) for k in columns] for record in records]
+            table = pa.Table.from_pylist(
+                records, schema=arrow_schema(config.schema_mapping)
             )
-
-            # Commit the transaction
-            duckdb_resource.commit()
+            if config.staging_folder:
+                # Stage this run's documents as one Parquet file and load it in
+                # a single scan; staging_compaction_job merges each load date
+                staging_path = storage.write_parquet(
+                    f"{config.staging_folder}/{config.table_name}/"
+                    f"load_date={datetime.now():%Y-%m-%d}/{context.run_id}.parquet",
+                    table,
+                )
+                rows_inserted = duckdb_resource.upsert_parquet(
+                    config.table_name, staging_path, key="document_id"
+                )
+            else:
+                rows_inserted = duckdb_resource.upsert_dataframe(
+                    config.table_name, table, key="document_id"
+                )
 
             context.log.info(
                 f"Inserted {rows_inserted} records into {config.table_name}"
@@ -110,11 +174,28 @@ def load_to_database(
             context.log.info("No records to insert")
             rows_inserted = 0
 
-        return dg.Output(
-            value={"rows_inserted": rows_inserted},
+        full_text_index = False
+        if config.search_index and records:
+            full_text_index = duckdb_resource.refresh_search_index(
+                config.table_name,
+                key="document_id",
+                # A full load recreated the table, so rebuild every side row
+                document_ids=(
+                    None
+                    if config.load_mode == LoadMode.FULL
+                    else [record["document_id"] for record in records]
+                ),
+                full_text_index=config.full_text_index,
+            )
+
+        return dg.MaterializeResult(
             metadata={
                 "rows_inserted": MetadataValue.int(rows_inserted),
                 "table_name": MetadataValue.text(config.table_name),
+                "load_mode": MetadataValue.text(config.load_mode.value),
+                "columns_added": MetadataValue.json(columns_added),
+                "staging_path": MetadataValue.text(staging_path or ""),
+                "full_text_index": MetadataValue.bool(full_text_index),
             },
         )
 
@@ -3,15 +3,22 @@ from dagster import (
     Definitions,
     EnvVar,
     load_assets_from_modules,
-    ScheduleDefinition,
-    define_asset_job,
 )
 from dagster_aws.s3 import S3Resource
 from src.resources.duckdb import DuckDBResource
+from src.resources.io_manager import DocumentReferenceIOManager
 from src.resources.storage import StorageResource, StorageType
 import os
 
 from src.assets import s1_extract_pdf_text, s2_structured_info, s3_db_load
+from src.jobs import (
+    document_processing_job,
+    search_index_job,
+    search_index_schedule,
+    staging_compaction_job,
+    staging_compaction_schedule,
+)
+from src.sensors.new_documents import new_documents_sensor
 
 
 def get_resource_defs():
@@ -36,6 +43,8 @@ def get_resource_defs():
                 storage_type=StorageType.S3,
                 local_base_path=None,
                 s3_bucket_name=EnvVar("S3_BUCKET_NAME"),
+                # Reuse downloads across runs on the same task or machine
+                local_cache_dir=os.getenv("STORAGE_CACHE_DIR"),
             ),
             "s3": S3Resource(
                 region_name=os.getenv("AWS_REGION", "us-east-1"),
@@ -43,7 +52,12 @@ def get_resource_defs():
         },
     }
 
-    return {**common_resources, **env_specific_resources[deployment_name]}
+    resources = {**common_resources, **env_specific_resources[deployment_name]}
+    # Assets exchange references to files in storage rather than their contents
+    resources["document_reference_io_manager"] = DocumentReferenceIOManager(
+        storage=resources["storage"]
+    )
+    return resources
 
 
 # Definizioni Dagster
@@ -52,14 +66,7 @@ defs = Definitions(
         [s1_extract_pdf_text, s2_structured_info, s3_db_load]
     ),
     resources=get_resource_defs(),
-    schedules=[
-        ScheduleDefinition(
-            name="daily_pdf_processing",
-            cron_schedule="0 0 * * *",
-            job=define_asset_job(
-                name="daily_pdf_processing_job",
-                selection="*",
-            ),
-        )
-    ],
+    jobs=[document_processing_job, search_index_job, staging_compaction_job],
+    schedules=[search_index_schedule, staging_compaction_schedule],
+    sensors=[new_documents_sensor],
 )
@@ -0,0 +1,101 @@
+from dagster import (
+    AssetKey,
+    Config,
+    DagsterRunStatus,
+    DefaultScheduleStatus,
+    OpExecutionContext,
+    RunRequest,
+    RunsFilter,
+    ScheduleDefinition,
+    ScheduleEvaluationContext,
+    SkipReason,
+    define_asset_job,
+    job,
+    op,
+    schedule,
+)
+
+from src.partitions import documents_partitions
+from src.utils.compaction import compact_partitions
+
+document_processing_job = define_asset_job(
+    name="document_processing_job",
+    selection="*",
+    partitions_def=documents_partitions,
+)
+
+
+class SearchIndexConfig(Config):
+    table_name: str = "documents"
+
+
+@op(required_resource_keys={"duckdb"}, pool="duckdb")
+def rebuild_full_text_index(
+    context: OpExecutionContext, config: SearchIndexConfig
+) -> None:
+    """Rebuild the full-text index over every loaded document."""
+    if not context.resources.duckdb.table_exists(config.table_name):
+        context.log.info(f"No {config.table_name} table to index yet")
+        return
+    context.resources.duckdb.rebuild_full_text_index(config.table_name)
+
+
+@job
+def search_index_job():
+    # Kept out of the per-document runs: the index is rebuilt for the whole
+    # table each time
+    rebuild_full_text_index()
+
+
+@schedule(
+    job=search_index_job,
+    cron_schedule="0 * * * *",
+    default_status=DefaultScheduleStatus.RUNNING,
+)
+def search_index_schedule(context: ScheduleEvaluationContext):
+    """Rebuild the full-text index hourly if documents were loaded since."""
+    loaded = context.instance.get_latest_materialization_event(
+        AssetKey("load_to_database")
+    )
+    if loaded is None:
+        return SkipReason("No documents loaded yet")
+    rebuilds = context.instance.get_run_records(
+        RunsFilter(job_name=search_index_job.name, statuses=[DagsterRunStatus.SUCCESS]),
+        limit=1,
+    )
+    if rebuilds and loaded.timestamp <= (rebuilds[0].start_time or 0):
+        return SkipReason("No documents loaded since the last rebuild")
+    return RunRequest()
+
+
+class StagingCompactionConfig(Config):
+    # Must match DuckDBStorageConfig of load_to_database
+    staging_folder: str = "s3_staging"
+    table_name: str = "documents"
+
+
+@op(required_resource_keys={"storage"})
+def compact_staged_parquet(
+    context: OpExecutionContext, config: StagingCompactionConfig
+) -> None:
+    """Merge the Parquet files staged on each load date into one file."""
+    merged = compact_partitions(
+        context.resources.storage, f"{config.staging_folder}/{config.table_name}"
+    )
+    for partition, file_count in merged.items():
+        context.log.info(f"Merged {file_count} Parquet files of {partition}")
+    if not merged:
+        context.log.info("No staged Parquet files to compact")
+
+
+@job
+def staging_compaction_job():
+    # Loads triggered per document stage one small file each
+    compact_staged_parquet()
+
+
+staging_compaction_schedule = ScheduleDefinition(
+    job=staging_compaction_job,
+    cron_schedule="0 3 * * *",
+    default_status=DefaultScheduleStatus.RUNNING,
+)
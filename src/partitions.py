@@ -0,0 +1,10 @@
+# src/partitions.py
+from dagster import BackfillPolicy, DynamicPartitionsDefinition
+
+# One partition per source document, keyed by the PDF file stem. Partitions
+# are registered by the new_documents_sensor as files land in storage.
+documents_partitions = DynamicPartitionsDefinition(name="documents")
+
+# Backfills run several documents per run, so each run can use its worker
+# pool, while still spreading the corpus over parallel runs
+documents_backfill_policy = BackfillPolicy.multi_run(max_partitions_per_run=10)
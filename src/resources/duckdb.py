@@ -2,12 +2,25 @@ import os
 from typing import Any, Dict, List, Optional, Union
 
 import duckdb
+import pandas as pd
+import pyarrow as pa
 from dagster_duckdb import DuckDBResource
 import dagster as dg
 
+from src.utils import metrics
+
 
 logger = dg.get_dagster_logger()
 
+# Text columns covered by the full-text index
+SEARCH_TEXT_COLUMNS = ["title", "abstract", "methodology", "conclusions"]
+# JSON list columns normalized into side tables: column -> value column name
+SEARCH_LIST_COLUMNS = {
+    "authors": "author",
+    "keywords": "keyword",
+    "proposed_models": "model",
+}
+
 
 class DuckDBResource(dg.ConfigurableResource):
     """Resource for DuckDB database operations using a file-based database."""
@@ -32,22 +45,68 @@ class DuckDBResource(dg.ConfigurableResource):
             f"Connected to DuckDB at {db_path} ({'read-only' if self.read_only else 'read-write'})"
         )
 
-    def create_table(self, table_name: str, schema: Dict[str, str]) -> None:
-        """Create a table if it doesn't exist."""
+    def create_table(
+        self,
+        table_name: str,
+        schema: Dict[str, str],
+        primary_key: Optional[str] = None,
+    ) -> None:
+        """Create a table, replacing any existing table of the same name."""
         # First, drop the table if it exists
         drop_stmt = f"DROP TABLE IF EXISTS {table_name};"
         self._conn.execute(drop_stmt)
         logger.info(f"Dropped table {table_name} if it existed")
 
         # Then create the table with the current schema
+        columns = [f"{k} {v}" for k, v in schema.items()]
+        if primary_key:
+            columns.append(f"PRIMARY KEY ({primary_key})")
         create_stmt = f"""
             CREATE TABLE {table_name} (
-                {', '.join(f'{k} {v}' for k, v in schema.items())}
+                {', '.join(columns)}
             );
         """
         self._conn.execute(create_stmt)
         logger.info(f"Created table {table_name}")
 
+    def ensure_table(
+        self,
+        table_name: str,
+        schema: Dict[str, str],
+        primary_key: Optional[str] = None,
+    ) -> List[str]:
+        """Create a table if it is missing, or add the schema columns it lacks.
+
+        Existing columns are never dropped or retyped. A table created without
+        ``primary_key`` gets it added, after removing duplicate keys. Returns
+        the columns added to an existing table.
+        """
+        if not self.table_exists(table_name):
+            self.create_table(table_name, schema, primary_key)
+            return []
+
+        existing = set(self._columns(table_name))
+        added = [column for column in schema if column not in existing]
+        for column in added:
+            self._conn.execute(
+                f"ALTER TABLE {table_name} ADD COLUMN {column} {schema[column]}"
+            )
+        if added:
+            logger.info(f"Added columns {added} to table {table_name}")
+
+        if primary_key and not self._has_primary_key(table_name):
+            # Keep the most recently inserted row of each key
+            self._conn.execute(
+                f"DELETE FROM {table_name} WHERE rowid NOT IN "
+                f"(SELECT max(rowid) FROM {table_name} GROUP BY {primary_key})"
+            )
+            self._conn.execute(
+                f"ALTER TABLE {table_name} ADD PRIMARY KEY ({primary_key})"
+            )
+            logger.info(f"Added primary key ({primary_key}) to table {table_name}")
+
+        return added
+
     def execute_query(self, query: str, params: Union[tuple, list, dict] = None) -> Any:
         """Execute a SQL query with optional parameters."""
         result = self._conn.execute(query, params if params else [])
@@ -65,11 +124,253 @@ class DuckDBResource(dg.ConfigurableResource):
 
     def execute_batch(self, query: str, data: List[tuple]) -> int:
         """Execute a batch operation with multiple parameter sets."""
-        for params in data:
-            self._conn.execute(query, params)
+        self._conn.executemany(query, data)
         # Just return the count of records we processed
         return len(data)
 
+    def upsert_dataframe(
+        self, table_name: str, data: Union[pd.DataFrame, pa.Table], key: str
+    ) -> int:
+        """Insert a DataFrame or Arrow table, updating rows whose ``key`` exists.
+
+        Relies on ``key`` being the table's primary key (see ``ensure_table``).
+        Only the columns present in ``data`` are written.
+        """
+        columns = (
+            list(data.columns) if isinstance(data, pd.DataFrame) else data.column_names
+        )
+        conflict_action = self._conflict_action(columns, key)
+
+        view_name = f"_upsert_{table_name}"
+        self._conn.register(view_name, data)
+        try:
+            with metrics.timed("db_insert", table=table_name):
+                self._conn.execute(
+                    f"INSERT INTO {table_name} BY NAME SELECT * FROM {view_name} "
+                    f"ON CONFLICT ({key}) {conflict_action}"
+                )
+        finally:
+            self._conn.unregister(view_name)
+
+        metrics.increment("db_rows_inserted", len(data))
+        return len(data)
+
+    def upsert_parquet(self, table_name: str, parquet_path: str, key: str) -> int:
+        """Upsert the rows of a Parquet file (local path or s3:// URI) by ``key``.
+
+        The file is ingested with ``read_parquet`` in a single scan.
+        """
+        if parquet_path.startswith("s3://"):
+            self._load_s3_support()
+
+        # The staging path's key=value folders are not columns of the table
+        source = "read_parquet(?, hive_partitioning = false)"
+        columns = [
+            row[0]
+            for row in self._conn.execute(
+                f"DESCRIBE SELECT * FROM {source}", [parquet_path]
+            ).fetchall()
+        ]
+        conflict_action = self._conflict_action(columns, key)
+
+        with metrics.timed("db_insert", table=table_name):
+            rows = self._conn.execute(
+                f"INSERT INTO {table_name} BY NAME SELECT * FROM {source} "
+                f"ON CONFLICT ({key}) {conflict_action}",
+                [parquet_path],
+            ).fetchone()[0]
+
+        metrics.increment("db_rows_inserted", rows)
+        return rows
+
+    def refresh_search_index(
+        self,
+        table_name: str,
+        key: str = "document_id",
+        document_ids: Optional[List[str]] = None,
+        full_text_index: bool = False,
+    ) -> bool:
+        """Refresh the search structures of a table loaded with documents.
+
+        The JSON lists in ``SEARCH_LIST_COLUMNS`` are unnested into indexed
+        side tables (``<table>_authors`` etc.) with a normalized copy of each
+        value, for the rows of ``document_ids`` or, when None, the whole
+        table. With ``full_text_index`` the full-text index is rebuilt too
+        (see ``rebuild_full_text_index``). Returns whether it was rebuilt.
+        """
+        columns = self._columns(table_name)
+        self._conn.begin()
+        try:
+            with metrics.timed("db_side_tables", table=table_name):
+                for column, value_column in SEARCH_LIST_COLUMNS.items():
+                    if column in columns:
+                        self._refresh_side_table(
+                            table_name, key, column, value_column, document_ids
+                        )
+                self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
+        return full_text_index and self.rebuild_full_text_index(table_name, key)
+
+    def rebuild_full_text_index(
+        self, table_name: str, key: str = "document_id"
+    ) -> bool:
+        """Rebuild the full-text index over ``SEARCH_TEXT_COLUMNS``.
+
+        DuckDB cannot update the index incrementally, so this reindexes the
+        whole table. Returns whether the index is available; without the
+        ``fts`` extension (e.g. offline) ``search_documents`` falls back to
+        scanning the text.
+        """
+        columns = self._columns(table_name)
+        text_columns = [column for column in SEARCH_TEXT_COLUMNS if column in columns]
+        try:
+            self._load_fts()
+            with metrics.timed("db_fts_index", table=table_name):
+                self._conn.execute(
+                    f"PRAGMA create_fts_index('{table_name}', '{key}', "
+                    f"{', '.join(repr(column) for column in text_columns)}, "
+                    "stemmer = 'porter', stopwords = 'english', overwrite = 1)"
+                )
+        except duckdb.Error as e:
+            logger.warning(f"Full-text index of {table_name} not built: {e}")
+            return False
+        logger.info(f"Built full-text index of {table_name} over {text_columns}")
+        return True
+
+    def search_documents(
+        self,
+        table_name: str,
+        query: Optional[str] = None,
+        author: Optional[str] = None,
+        keyword: Optional[str] = None,
+        model: Optional[str] = None,
+        limit: int = 10,
+        key: str = "document_id",
+    ) -> List[Dict[str, Any]]:
+        """Documents matching ``query``, best first, with their ``score``.
+
+        ``query`` is ranked with BM25 when the full-text index exists, and by
+        the number of query terms found otherwise. ``author``, ``keyword`` and
+        ``model`` keep documents listing that value (case-insensitive), looked
+        up in the indexed side tables of ``refresh_search_index``. Without a
+        query, matching documents are returned in ``key`` order.
+        """
+        filters, params = [], []
+        for column, value in (
+            ("authors", author),
+            ("keywords", keyword),
+            ("proposed_models", model),
+        ):
+            if value is not None:
+                value_column = SEARCH_LIST_COLUMNS[column]
+                filters.append(
+                    f"{key} IN (SELECT {key} FROM {table_name}_{column} "
+                    f"WHERE {value_column}_normalized = ?)"
+                )
+                params.append(self._normalize(value))
+
+        if not query:
+            score = "NULL"
+        elif self._has_fts_index(table_name) and self._try_load_fts():
+            score = f"fts_main_{table_name}.match_bm25({key}, ?)"
+            params.insert(0, query)
+        else:
+            terms = [self._normalize(term) for term in query.split()]
+            columns = self._columns(table_name)
+            text_columns = [
+                column for column in SEARCH_TEXT_COLUMNS if column in columns
+            ]
+            score = " + ".join(
+                f"(contains(lower(coalesce({column}, '')), ?))::INTEGER"
+                for term in terms
+                for column in text_columns
+            )
+            params[:0] = [term for term in terms for _ in text_columns]
+        if query:
+            filters.append("score > 0")
+
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        order = "score DESC" if query else key
+        return self.execute_and_fetch(
+            f"SELECT * FROM (SELECT *, {score} AS score FROM {table_name}) "
+            f"{where} ORDER BY {order} LIMIT ?",
+            params + [limit],
+        )
+
+    def _refresh_side_table(
+        self,
+        table_name: str,
+        key: str,
+        column: str,
+        value_column: str,
+        document_ids: Optional[List[str]],
+    ) -> None:
+        side_table = f"{table_name}_{column}"
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {side_table} "
+            f"({key} VARCHAR, {value_column} VARCHAR, "
+            f"{value_column}_normalized VARCHAR)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {side_table}_{value_column}_idx "
+            f"ON {side_table} ({value_column}_normalized)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {side_table}_{key}_idx "
+            f"ON {side_table} ({key})"
+        )
+
+        selection, params = "", []
+        if document_ids is not None:
+            selection = f"WHERE {key} IN (SELECT unnest(?::VARCHAR[]))"
+            params = [document_ids]
+        self._conn.execute(f"DELETE FROM {side_table} {selection}", params)
+        # Scalars (a single author as a string, {} ...) cannot be cast to a
+        # list, so only JSON arrays are unnested
+        arrays = f"{'AND' if selection else 'WHERE'} json_type({column}) = 'ARRAY'"
+        self._conn.execute(
+            f"INSERT INTO {side_table} "
+            f"SELECT {key}, trim(value), lower(trim(value)) FROM ("
+            f"SELECT {key}, unnest(CAST({column} AS VARCHAR[])) AS value "
+            f"FROM {table_name} {selection} {arrays}) WHERE trim(value) <> ''",
+            params,
+        )
+
+    @staticmethod
+    def _normalize(value: str) -> str:
+        return value.strip().lower()
+
+    def _columns(self, table_name: str) -> List[str]:
+        return [
+            row[0]
+            for row in self._conn.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_name = ?",
+                [table_name],
+            ).fetchall()
+        ]
+
+    def _load_fts(self) -> None:
+        self._conn.execute("INSTALL fts; LOAD fts;")
+
+    def _try_load_fts(self) -> bool:
+        try:
+            self._load_fts()
+        except duckdb.Error as e:
+            logger.warning(f"fts extension unavailable, scanning text instead: {e}")
+            return False
+        return True
+
+    def _has_fts_index(self, table_name: str) -> bool:
+        result = self._conn.execute(
+            "SELECT count(*) FROM information_schema.schemata WHERE schema_name = ?",
+            [f"fts_main_{table_name}"],
+        )
+        return result.fetchone()[0] > 0
+
     def table_exists(self, table_name: str) -> bool:
         """Check if a table exists in the database."""
         result = self._conn.execute(
@@ -77,6 +378,29 @@ class DuckDBResource(dg.ConfigurableResource):
         )
         return result.fetchone()[0] > 0
 
+    @staticmethod
+    def _conflict_action(columns: List[str], key: str) -> str:
+        updates = ", ".join(
+            f"{column} = EXCLUDED.{column}" for column in columns if column != key
+        )
+        return f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+
+    def _load_s3_support(self) -> None:
+        """Let DuckDB read s3:// paths with the default AWS credential chain."""
+        self._conn.execute("INSTALL httpfs; LOAD httpfs;")
+        self._conn.execute(
+            "CREATE SECRET IF NOT EXISTS s3_credentials "
+            "(TYPE s3, PROVIDER credential_chain)"
+        )
+
+    def _has_primary_key(self, table_name: str) -> bool:
+        result = self._conn.execute(
+            "SELECT count(*) FROM duckdb_constraints() "
+            "WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'",
+            [table_name],
+        )
+        return result.fetchone()[0] > 0
+
     def commit(self) -> None:
         """Commit the current transaction."""
         self._conn.commit()
@@ -0,0 +1,66 @@
+from typing import Dict
+
+from dagster import (
+    ConfigurableIOManager,
+    InputContext,
+    OutputContext,
+    ResourceDependency,
+)
+
+from src.resources.storage import StorageResource
+from src.types.documents import DocumentReference
+
+
+class DocumentReferenceIOManager(ConfigurableIOManager):
+    """IO manager passing document references, not contents, between assets.
+
+    Assets output a dict of ``DocumentReference`` keyed by partition key. One
+    small JSON file per partition is written through ``StorageResource``, so
+    an output may span several partitions and downstream assets load only the
+    references of the partitions they need.
+    """
+
+    storage: ResourceDependency[StorageResource]
+    references_folder: str = "_references"
+
+    def _path(self, context, partition_key: str = None) -> str:
+        asset_path = "/".join(context.asset_key.path)
+        if partition_key is None:
+            return f"{self.references_folder}/{asset_path}.json"
+        return f"{self.references_folder}/{asset_path}/{partition_key}.json"
+
+    def handle_output(
+        self, context: OutputContext, obj: Dict[str, DocumentReference]
+    ) -> None:
+        if not context.has_asset_partitions:
+            self.storage.write_file(
+                self._path(context),
+                {key: ref.model_dump() for key, ref in obj.items()},
+            )
+            return
+
+        for partition_key in context.asset_partition_keys:
+            # Written even when empty so downstream loads do not fail
+            refs = {partition_key: obj[partition_key]} if partition_key in obj else {}
+            self.storage.write_file(
+                self._path(context, partition_key),
+                {key: ref.model_dump() for key, ref in refs.items()},
+            )
+
+        context.add_output_metadata({"documents": len(obj)})
+
+    def load_input(self, context: InputContext) -> Dict[str, DocumentReference]:
+        paths = (
+            [self._path(context, key) for key in context.asset_partition_keys]
+            if context.has_asset_partitions
+            else [self._path(context)]
+        )
+
+        refs = {}
+        for path in paths:
+            if not self.storage.exists(path):
+                context.log.warning(f"No document references found at {path}")
+                continue
+            stored = self.storage.read_json(path)
+            refs.update({key: DocumentReference(**ref) for key, ref in stored.items()})
+        return refs
@@ -4,10 +4,41 @@ from enum import Enum
 from pathlib import Path
 import os
 import json
-from typing import BinaryIO, Dict, List, Optional, Union, Any
+import hashlib
+import io
+import mmap
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import (
+    Any,
+    BinaryIO,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from src.types.storage import FileInfo
+from src.utils import metrics
+from src.utils.s3_io import S3MultipartWriter, S3RangeReader
+from src.utils.serialization import OutputFormat, decode, encode, encode_to
+from src.utils.storage_cache import StorageCache
 
 logger = get_dagster_logger()
 
+MB = 1024 * 1024
+
+# Guards lazy creation of the shared S3 client and local cache
+_LAZY_INIT_LOCK = threading.Lock()
+
 
 class StorageType(str, Enum):
     LOCAL = "local"
@@ -20,6 +51,20 @@ class StorageResource(ConfigurableResource):
     storage_type: StorageType
     local_base_path: Optional[str] = None
     s3_bucket_name: Optional[str] = None
+    s3_region_name: Optional[str] = None
+    # Custom endpoint for S3-compatible stores or a local stand-in (e.g. moto)
+    s3_endpoint_url: Optional[str] = None
+    # Connections kept open by the shared client; size it to the worker count
+    s3_max_pool_connections: int = 32
+    s3_retry_mode: str = "adaptive"
+    s3_max_retries: int = 5
+    # Downloads above the threshold are split into concurrent ranged GETs
+    s3_multipart_threshold_mb: int = 16
+    s3_multipart_chunksize_mb: int = 8
+    s3_transfer_max_concurrency: int = 4
+    # Optional local copy of S3 objects, validated by ETag on every read
+    local_cache_dir: Optional[str] = None
+    local_cache_max_mb: int = 10240
 
     def validate_config(self) -> None:
         """Validate storage configuration"""
@@ -33,109 +78,446 @@ class StorageResource(ConfigurableResource):
         self.validate_config()
         if self.storage_type == StorageType.LOCAL:
             os.makedirs(self.local_base_path, exist_ok=True)
+        elif self.storage_type == StorageType.S3:
+            # Create the client once, up front, rather than per call
+            self._s3_client = self._create_s3_client()
+
+    @property
+    def s3_client(self):
+        """S3 client shared by every call and thread using this resource.
+
+        boto3 clients are thread-safe once created; creation itself is not, so
+        it happens at most once under a lock.
+        """
+        client = getattr(self, "_s3_client", None)
+        if client is None:
+            with _LAZY_INIT_LOCK:
+                client = getattr(self, "_s3_client", None)
+                if client is None:
+                    client = self._create_s3_client()
+                    self._s3_client = client
+        return client
+
+    @property
+    def local_cache(self) -> Optional[StorageCache]:
+        """Read-through cache of S3 objects, when ``local_cache_dir`` is set."""
+        if self.storage_type != StorageType.S3 or not self.local_cache_dir:
+            return None
+        cache = getattr(self, "_local_cache", None)
+        if cache is None:
+            with _LAZY_INIT_LOCK:
+                cache = getattr(self, "_local_cache", None)
+                if cache is None:
+                    cache = StorageCache(
+                        self.local_cache_dir, self.local_cache_max_mb * MB
+                    )
+                    self._local_cache = cache
+        return cache
+
+    def _create_s3_client(self):
+        import boto3
+        from botocore.config import Config as BotoConfig
+
+        session = boto3.session.Session()
+        return session.client(
+            "s3",
+            region_name=self.s3_region_name,
+            endpoint_url=self.s3_endpoint_url,
+            config=BotoConfig(
+                max_pool_connections=self.s3_max_pool_connections,
+                retries={
+                    "mode": self.s3_retry_mode,
+                    "max_attempts": self.s3_max_retries,
+                },
+            ),
+        )
 
     def list_files(self, folder_path: str, extension: str = None) -> List[str]:
-        """List files in a folder with optional extension filter."""
+        """List files under a folder (recursively, like an S3 prefix) with optional
+        extension filter."""
+        return [info.path for info in self.iter_files(folder_path, extension)]
+
+    def iter_files(
+        self,
+        folder_path: str,
+        extension: str = None,
+        max_workers: Optional[int] = None,
+    ) -> Iterator[FileInfo]:
+        """Yield the files under a folder with their size, mtime and ETag.
+
+        S3 prefixes are paged through with continuation tokens, so listings are
+        not capped at 1,000 keys. With ``max_workers``, the sub-prefixes
+        directly under the folder are listed in parallel and their files are
+        yielded as each sub-prefix completes. Listing errors are raised.
+        """
         if self.storage_type == StorageType.LOCAL:
             base_dir = Path(self.local_base_path) / folder_path
             if not base_dir.exists():
-                logger.warning(f"Directory {base_dir} does not exist.")
-                return []
-            files = list(base_dir.glob(f"*{extension if extension else ''}"))
-            return [
-                str(f.relative_to(Path(self.local_base_path)))
-                for f in files
-                if f.is_file()
-            ]
+                # Like an S3 prefix without keys
+                logger.debug(f"Directory {base_dir} does not exist.")
+                return
+            for f in base_dir.rglob(f"*{extension if extension else ''}"):
+                if f.is_file():
+                    stat = f.stat()
+                    yield FileInfo(
+                        path=str(f.relative_to(Path(self.local_base_path))),
+                        size_bytes=stat.st_size,
+                        last_modified=datetime.fromtimestamp(
+                            stat.st_mtime, tz=timezone.utc
+                        ),
+                    )
         elif self.storage_type == StorageType.S3:
-            import boto3
-
-            s3_client = boto3.client("s3")
+            prefix = f"{folder_path.rstrip('/')}/" if folder_path else ""
             try:
-                response = s3_client.list_objects_v2(
-                    Bucket=self.s3_bucket_name, Prefix=folder_path
-                )
-                if "Contents" not in response:
-                    return []
-                return [
-                    item["Key"]
-                    for item in response["Contents"]
-                    if not extension or item["Key"].endswith(extension)
-                ]
+                if not max_workers:
+                    yield from self._iter_s3_prefix(prefix, extension)
+                    return
+
+                # Files directly under the folder, and its sub-prefixes
+                sub_prefixes = []
+                for page in self._s3_pages(prefix, delimiter="/"):
+                    sub_prefixes.extend(
+                        common["Prefix"] for common in page.get("CommonPrefixes", [])
+                    )
+                    yield from self._file_infos(page, extension)
+
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(list, self._iter_s3_prefix(sub, extension))
+                        for sub in sub_prefixes
+                    ]
+                    for future in as_completed(futures):
+                        yield from future.result()
             except Exception as e:
-                logger.error(f"Error listing S3 files: {e}")
-                return []
+                logger.error(f"Error listing S3 files under {prefix}: {e}")
+                raise
+
+    def _iter_s3_prefix(self, prefix: str, extension: str = None) -> Iterator[FileInfo]:
+        for page in self._s3_pages(prefix):
+            yield from self._file_infos(page, extension)
+
+    def _s3_pages(self, prefix: str, delimiter: str = None) -> Iterator[Dict[str, Any]]:
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        params = {"Bucket": self.s3_bucket_name, "Prefix": prefix}
+        if delimiter:
+            params["Delimiter"] = delimiter
+        return paginator.paginate(**params)
+
+    @staticmethod
+    def _file_infos(page: Dict[str, Any], extension: str = None) -> Iterator[FileInfo]:
+        for item in page.get("Contents", []):
+            if extension and not item["Key"].endswith(extension):
+                continue
+            yield FileInfo(
+                path=item["Key"],
+                size_bytes=item["Size"],
+                last_modified=item["LastModified"],
+                etag=item.get("ETag", "").strip('"') or None,
+            )
 
     def read_file(self, file_path: str) -> BinaryIO:
-        """Read a file from storage."""
+        """Read a file from storage as a stream (see ``open_read``)."""
+        return self.open_read(file_path)
+
+    def open_read(self, file_path: str) -> BinaryIO:
+        """Open a stored file for reading without loading it into memory.
+
+        Local files are memory-mapped. S3 objects are read through ranged GETs
+        of ``s3_multipart_chunksize_mb``, fetched as the stream is consumed,
+        or memory-mapped from the local cache when it is enabled.
+        """
         if self.storage_type == StorageType.LOCAL:
-            full_path = Path(self.local_base_path) / file_path
-            return open(full_path, "rb")
+            return self._open_mapped(Path(self.local_base_path) / file_path)
         elif self.storage_type == StorageType.S3:
-            import boto3
-
-            s3_client = boto3.client("s3")
-            import io
+            if self.local_cache:
+                return self._open_mapped(self._cached_copy(file_path))
 
-            data = io.BytesIO()
+            chunk_size = self.s3_multipart_chunksize_mb * MB
             try:
-                s3_client.download_fileobj(self.s3_bucket_name, file_path, data)
-                data.seek(0)
-                return data
+                reader = S3RangeReader(
+                    self.s3_client, self.s3_bucket_name, file_path, chunk_size
+                )
             except Exception as e:
                 logger.error(f"Error reading S3 file {file_path}: {e}")
                 raise
+            return io.BufferedReader(reader, buffer_size=chunk_size)
 
-    def write_file(
-        self, file_path: str, content: Union[bytes, str, Dict[str, Any]]
-    ) -> str:
-        """Write content to a file in storage."""
+    @contextmanager
+    def open_write(self, file_path: str) -> Iterator[BinaryIO]:
+        """Open a file in storage for streamed writing.
+
+        The file only appears once the block exits without error. Locally it
+        is written beside the target and renamed into place; on S3, content
+        above ``s3_multipart_threshold_mb`` is sent as a multipart upload of
+        ``s3_multipart_chunksize_mb`` parts, so memory use stays bounded. With
+        the local cache enabled, S3 content is written to the cache first and
+        uploaded from there.
+        """
         if self.storage_type == StorageType.LOCAL:
             full_path = Path(self.local_base_path) / file_path
             os.makedirs(full_path.parent, exist_ok=True)
-            mode = "wb" if isinstance(content, bytes) else "w"
-            with open(full_path, mode) as f:
-                if isinstance(content, (dict, list)):
-                    json.dump(content, f)
-                else:
-                    f.write(content)
-            return str(full_path)
-        elif self.storage_type == StorageType.S3:
-            import boto3
-
-            s3_client = boto3.client("s3")
+            # Readers never see a partial file and concurrent writers do not
+            # interleave
+            tmp_path = full_path.with_name(
+                f".{full_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            try:
+                with open(tmp_path, "wb") as f:
+                    yield f
+                os.replace(tmp_path, full_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        elif self.storage_type == StorageType.S3 and self.local_cache:
+            # Write-through: the local copy is uploaded, then kept in the cache
+            tmp_path = self.local_cache.temp_path()
             try:
-                if isinstance(content, (dict, list)):
-                    content = json.dumps(content).encode("utf-8")
-                elif isinstance(content, str):
-                    content = content.encode("utf-8")
-                s3_client.put_object(
-                    Bucket=self.s3_bucket_name, Key=file_path, Body=content
+                with open(tmp_path, "wb") as f:
+                    yield f
+                self.s3_client.upload_file(
+                    str(tmp_path),
+                    self.s3_bucket_name,
+                    file_path,
+                    Config=self._transfer_config(),
                 )
-                return f"s3://{self.s3_bucket_name}/{file_path}"
-            except Exception as e:
+                etag = self.s3_client.head_object(
+                    Bucket=self.s3_bucket_name, Key=file_path
+                )["ETag"]
+                self.local_cache.add(file_path, etag, tmp_path)
+            except BaseException as e:
+                logger.error(f"Error writing to S3 file {file_path}: {e}")
+                tmp_path.unlink(missing_ok=True)
+                raise
+        elif self.storage_type == StorageType.S3:
+            writer = S3MultipartWriter(
+                self.s3_client,
+                self.s3_bucket_name,
+                file_path,
+                part_size_bytes=self.s3_multipart_chunksize_mb * MB,
+                threshold_bytes=self.s3_multipart_threshold_mb * MB,
+            )
+            try:
+                yield writer
+                writer.close()
+            except BaseException as e:
                 logger.error(f"Error writing to S3 file {file_path}: {e}")
+                if not writer.closed:
+                    writer.abort()
                 raise
 
+    def get_local_path(self, file_path: str) -> Optional[Path]:
+        """Local path of a stored file, or None when it must be downloaded."""
+        if self.storage_type == StorageType.LOCAL:
+            return Path(self.local_base_path) / file_path
+        return None
+
+    def download_to_path(self, file_path: str, local_path: Path) -> Path:
+        """Download a file to ``local_path``.
+
+        On S3, files above ``s3_multipart_threshold_mb`` are fetched as
+        concurrent ranged GETs.
+        """
+        local_path = Path(local_path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        with metrics.timed("storage_download", path=file_path):
+            if self.storage_type == StorageType.LOCAL:
+                shutil.copyfile(Path(self.local_base_path) / file_path, local_path)
+            elif self.storage_type == StorageType.S3 and self.local_cache:
+                cached = self._cached_copy(file_path)
+                try:
+                    # A hard link shares the cached copy without duplicating it
+                    os.link(cached, local_path)
+                except OSError:
+                    shutil.copyfile(cached, local_path)
+            elif self.storage_type == StorageType.S3:
+                self._download_s3(file_path, local_path)
+        metrics.increment("storage_bytes_downloaded", local_path.stat().st_size)
+        return local_path
+
+    def _download_s3(self, file_path: str, local_path: Path) -> None:
+        try:
+            self.s3_client.download_file(
+                self.s3_bucket_name,
+                file_path,
+                str(local_path),
+                Config=self._transfer_config(),
+            )
+        except Exception as e:
+            logger.error(f"Error downloading S3 file {file_path}: {e}")
+            raise
+
+    def _cached_copy(self, file_path: str) -> Path:
+        """Local cache path of an S3 object, fetching it if missing or stale."""
+        etag = self.s3_client.head_object(Bucket=self.s3_bucket_name, Key=file_path)[
+            "ETag"
+        ]
+        cached = self.local_cache.get(file_path, etag)
+        if cached is not None:
+            return cached
+
+        tmp_path = self.local_cache.temp_path()
+        try:
+            self._download_s3(file_path, tmp_path)
+            return self.local_cache.add(file_path, etag, tmp_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def _transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.s3_multipart_threshold_mb * MB,
+            multipart_chunksize=self.s3_multipart_chunksize_mb * MB,
+            max_concurrency=self.s3_transfer_max_concurrency,
+        )
+
+    @staticmethod
+    def _open_mapped(path: Path) -> BinaryIO:
+        f = open(path, "rb")
+        if path.stat().st_size == 0:
+            # Empty files cannot be memory-mapped
+            return f
+        with f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def write_file(
+        self, file_path: str, content: Union[bytes, str, Dict[str, Any]]
+    ) -> str:
+        """Write content to a file in storage."""
+        if isinstance(content, (dict, list)):
+            content = json.dumps(content)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        with metrics.timed("storage_write", path=file_path):
+            with self.open_write(file_path) as f:
+                f.write(content)
+        metrics.increment("storage_bytes_written", len(content))
+
+        return self._location(file_path)
+
+    def write_json(
+        self, file_path: str, content: Any, streamed_keys: Collection[str] = ()
+    ) -> Tuple[str, int]:
+        """Write content in the format given by the file suffix.
+
+        ``.json`` is pretty-printed JSON; ``.json.gz``, ``.json.zst`` and
+        ``.msgpack`` are compact and compressed (see ``OutputFormat``). Values
+        of ``streamed_keys`` may be iterables of text chunks, which are encoded
+        and written out as they are read (see ``encode_to``). Returns the
+        SHA-256 and size in bytes of what was written.
+        """
+        output_format = OutputFormat.from_path(file_path)
+        if not streamed_keys:
+            payload = encode(content, output_format)
+            self.write_file(file_path, payload)
+            return hashlib.sha256(payload).hexdigest(), len(payload)
+
+        with metrics.timed("storage_write", path=file_path):
+            with self.open_write(file_path) as f:
+                sink = _HashingWriter(f)
+                encode_to(sink, content, output_format, streamed_keys)
+        metrics.increment("storage_bytes_written", sink.size)
+        return sink.digest.hexdigest(), sink.size
+
+    def write_parquet(self, file_path: str, table: pa.Table) -> str:
+        """Write an Arrow table as a zstd-compressed Parquet file.
+
+        Returns the location DuckDB and other readers can open it from.
+        """
+        with metrics.timed("storage_write", path=file_path):
+            with self.open_write(file_path) as f:
+                pq.write_table(table, f, compression="zstd")
+                size = f.tell()
+        metrics.increment("storage_bytes_written", size)
+
+        return self._location(file_path)
+
     def read_json(self, file_path: str) -> Dict[str, Any]:
-        """Read JSON file from storage."""
+        """Read a JSON file from storage, decoding the formats of ``write_json``."""
+        with metrics.timed("storage_read", path=file_path):
+            data = self._read_bytes(file_path)
+        metrics.increment("storage_bytes_read", len(data))
+        return decode(data, OutputFormat.from_path(file_path))
+
+    def _read_bytes(self, file_path: str) -> bytes:
         if self.storage_type == StorageType.LOCAL:
-            full_path = Path(self.local_base_path) / file_path
-            with open(full_path) as f:
-                return json.load(f)
+            return (Path(self.local_base_path) / file_path).read_bytes()
+        elif self.storage_type == StorageType.S3 and self.local_cache:
+            return self._cached_copy(file_path).read_bytes()
         elif self.storage_type == StorageType.S3:
-            import boto3
-
-            s3_client = boto3.client("s3")
+            s3_client = self.s3_client
             try:
                 response = s3_client.get_object(
                     Bucket=self.s3_bucket_name, Key=file_path
                 )
-                return json.loads(response["Body"].read().decode("utf-8"))
+                return response["Body"].read()
             except Exception as e:
                 logger.error(f"Error reading S3 JSON file {file_path}: {e}")
                 raise
 
+    def exists(self, file_path: str) -> bool:
+        """Check whether a file exists in storage."""
+        if self.storage_type == StorageType.LOCAL:
+            return (Path(self.local_base_path) / file_path).is_file()
+        elif self.storage_type == StorageType.S3:
+            from botocore.exceptions import ClientError
+
+            s3_client = self.s3_client
+            try:
+                s3_client.head_object(Bucket=self.s3_bucket_name, Key=file_path)
+                return True
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    return False
+                logger.error(f"Error checking S3 file {file_path}: {e}")
+                raise
+
+    def get_file_info(self, file_path: str) -> Optional[FileInfo]:
+        """Size, mtime and ETag of a single file, or None if it does not exist."""
+        if self.storage_type == StorageType.LOCAL:
+            path = Path(self.local_base_path) / file_path
+            if not path.is_file():
+                return None
+            stat = path.stat()
+            return FileInfo(
+                path=file_path,
+                size_bytes=stat.st_size,
+                last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            )
+        elif self.storage_type == StorageType.S3:
+            from botocore.exceptions import ClientError
+
+            try:
+                response = self.s3_client.head_object(
+                    Bucket=self.s3_bucket_name, Key=file_path
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    return None
+                logger.error(f"Error checking S3 file {file_path}: {e}")
+                raise
+            return FileInfo(
+                path=file_path,
+                size_bytes=response["ContentLength"],
+                last_modified=response["LastModified"],
+                etag=response.get("ETag", "").strip('"') or None,
+            )
+
+    def delete_file(self, file_path: str) -> None:
+        """Delete a file from storage; a missing file is not an error."""
+        if self.storage_type == StorageType.LOCAL:
+            (Path(self.local_base_path) / file_path).unlink(missing_ok=True)
+        elif self.storage_type == StorageType.S3:
+            self.s3_client.delete_object(Bucket=self.s3_bucket_name, Key=file_path)
+
+    def _location(self, file_path: str) -> str:
+        """Local path or s3:// URI other tools can open a stored file from."""
+        if self.storage_type == StorageType.LOCAL:
+            return str(Path(self.local_base_path) / file_path)
+        return f"s3://{self.s3_bucket_name}/{file_path}"
+
     def get_full_path(self, subfolder: str) -> str:
         """Get the full path for a subfolder based on storage type."""
         if self.storage_type == StorageType.LOCAL:
@@ -150,3 +532,20 @@ class StorageResource(ConfigurableResource):
             return f"s3://{self.s3_bucket_name}/{subfolder}"
         else:
             raise ValueError(f"Unsupported storage type: {self.storage_type}")
+
+
+class _HashingWriter(io.RawIOBase):
+    """Forwards writes to a stream while hashing and counting the bytes."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.stream.write(data)
@@ -0,0 +1,127 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import dagster as dg
+
+from src.assets.s1_extract_pdf_text import DOCUMENT_PATH_TAG, PDFExtractionConfig
+from src.jobs import document_processing_job
+from src.partitions import documents_partitions
+from src.resources.storage import StorageResource
+from src.types.storage import FileInfo
+
+
+def file_version(info: FileInfo) -> str:
+    """Identifies the content of a file: its ETag on S3, else size and mtime."""
+    return info.etag or f"{info.size_bytes}-{info.last_modified.timestamp():.0f}"
+
+
+def versioned_key(key: str, info: FileInfo) -> str:
+    return f"{key}:{file_version(info)}"
+
+
+def _read_cursor(cursor: Optional[str]) -> Tuple[Optional[datetime], Set[str]]:
+    """Latest modification time and the versions of the files modified then."""
+    if not cursor:
+        return None, set()
+    if not cursor.startswith("{"):
+        # Written before versions were kept
+        return datetime.fromisoformat(cursor), set()
+    state = json.loads(cursor)
+    return datetime.fromisoformat(state["last_modified"]), set(state["versions"])
+
+
+def _write_cursor(
+    latest: Optional[datetime], found: Dict[str, FileInfo]
+) -> Optional[str]:
+    if latest is None:
+        return None
+    versions = sorted(
+        versioned_key(key, info)
+        for key, info in found.items()
+        if info.last_modified == latest
+    )
+    return json.dumps({"last_modified": latest.isoformat(), "versions": versions})
+
+
+def _modified_since(info: FileInfo, since: datetime, seen: Set[str]) -> bool:
+    if info.last_modified > since:
+        return True
+    return (
+        info.last_modified == since
+        and versioned_key(Path(info.path).stem, info) not in seen
+    )
+
+
+@dg.sensor(job=document_processing_job, minimum_interval_seconds=60)
+def new_documents_sensor(
+    context: dg.SensorEvaluationContext, storage: StorageResource
+) -> dg.SensorResult:
+    """Register every new PDF in the input folder as a document partition and
+    request a run for it, and for every PDF replaced since the last evaluation.
+
+    Partitions are keyed by file stem, so PDFs sharing a stem in different
+    sub-folders are reported and skipped rather than merged into one.
+    """
+    input_folder = PDFExtractionConfig().input_folder
+
+    by_stem: Dict[str, List[FileInfo]] = defaultdict(list)
+    for info in storage.iter_files(input_folder, ".pdf"):
+        by_stem[Path(info.path).stem].append(info)
+
+    duplicates = {stem: infos for stem, infos in by_stem.items() if len(infos) > 1}
+    for stem, infos in sorted(duplicates.items()):
+        context.log.error(
+            f"Skipping PDFs sharing the document key {stem}: "
+            f"{sorted(info.path for info in infos)}"
+        )
+
+    found = {
+        stem: infos[0] for stem, infos in by_stem.items() if stem not in duplicates
+    }
+    existing = set(context.instance.get_dynamic_partitions(documents_partitions.name))
+    new_keys = sorted(key for key in found if key not in existing)
+
+    # The cursor is the latest modification time seen, with the version of
+    # each file modified at that time: files modified later, or at that time
+    # but not seen yet, were added or replaced. Without one, only
+    # unregistered files are new
+    since, seen = _read_cursor(context.cursor)
+    changed = [
+        key
+        for key in sorted(found)
+        if key not in existing
+        or (since is not None and _modified_since(found[key], since, seen))
+    ]
+    latest = max((info.last_modified for info in found.values()), default=since)
+    cursor = _write_cursor(latest, found)
+
+    if not changed:
+        return dg.SensorResult(
+            skip_reason=f"No new or replaced PDFs in {input_folder}",
+            cursor=cursor,
+        )
+
+    context.log.info(
+        f"Requesting runs for {len(changed)} PDF(s), registering "
+        f"{len(new_keys)} new document partition(s)"
+    )
+    return dg.SensorResult(
+        # Run keys include the file version, so a replaced PDF runs again
+        # while a version already requested is deduplicated
+        run_requests=[
+            dg.RunRequest(
+                run_key=versioned_key(key, found[key]),
+                partition_key=key,
+                # Spares the run a listing of the input folder
+                tags={DOCUMENT_PATH_TAG: found[key].path},
+            )
+            for key in changed
+        ],
+        dynamic_partitions_requests=(
+            [documents_partitions.build_add_request(new_keys)] if new_keys else []
+        ),
+        cursor=cursor,
+    )
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import tempfile
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import logfire
+
+from src.services.llm_processor import LLMProcessor
+from src.utils import metrics
+
+BATCH_ENDPOINT = "/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchLLMProcessor:
+    """Runs the requests of an LLMProcessor through the OpenAI/Azure Batch API.
+
+    All requests, including one per chunk for oversized documents, are streamed
+    to a single JSONL file, uploaded and submitted as one batch. The batch is
+    polled until it finishes, and the results are mapped back to their
+    documents. Responses already in the processor's cache are not submitted,
+    and new responses are added to it.
+    """
+
+    def __init__(
+        self,
+        llm_processor: LLMProcessor,
+        poll_interval_seconds: float = 60,
+        completion_window: str = "24h",
+    ):
+        self.llm_processor = llm_processor
+        self.client = llm_processor.client
+        self.poll_interval_seconds = poll_interval_seconds
+        self.completion_window = completion_window
+
+    async def extract_all(
+        self, documents: Iterable[Tuple[str, str]], use_field_groups: bool = False
+    ) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """Extract every document in one batch.
+
+        ``documents`` yields (document id, text) pairs; each text is only held
+        until its requests are written out. Returns, per document id, the
+        structured result or the exception that prevented it, so one failed
+        document does not fail the others.
+        """
+        # Per document: (fields, responses of each chunk) for every field group
+        plans: Dict[str, List[Tuple[Optional[List[str]], List[Optional[str]]]]] = {}
+        pending: Dict[str, Tuple[str, int, int, Optional[str]]] = {}
+
+        with tempfile.NamedTemporaryFile("w+b", suffix=".jsonl") as f:
+            for doc_id, text in documents:
+                groups = (
+                    self.llm_processor.field_group_requests(text)
+                    if use_field_groups
+                    else [(None, text)]
+                )
+                plans[doc_id] = []
+                for group_index, (fields, section) in enumerate(groups):
+                    chunks = self.llm_processor.prepare_chunks(section)
+                    plans[doc_id].append((fields, [None] * len(chunks)))
+                    for index, chunk in enumerate(chunks):
+                        request = self.llm_processor.build_request(chunk, fields)
+                        cache_key = self.llm_processor.cache_key(request)
+                        cached = (
+                            self.llm_processor.cache.get(cache_key)
+                            if cache_key
+                            else None
+                        )
+                        if cached is not None:
+                            plans[doc_id][group_index][1][index] = cached
+                            continue
+
+                        custom_id = f"request-{len(pending)}"
+                        pending[custom_id] = (doc_id, group_index, index, cache_key)
+                        line = {
+                            "custom_id": custom_id,
+                            "method": "POST",
+                            "url": BATCH_ENDPOINT,
+                            "body": request,
+                        }
+                        f.write(json.dumps(line, ensure_ascii=False).encode("utf-8"))
+                        f.write(b"\n")
+
+            # The client only uploads real file objects, not tempfile's wrapper
+            results = await self._run_batch(f.file, len(pending)) if pending else {}
+
+        errors: Dict[str, Exception] = {}
+        for custom_id, (doc_id, group_index, index, cache_key) in pending.items():
+            result = results.get(custom_id)
+            if isinstance(result, str):
+                plans[doc_id][group_index][1][index] = result
+                if cache_key:
+                    self.llm_processor.cache.set(cache_key, result)
+            else:
+                errors[doc_id] = result or RuntimeError(
+                    f"No batch result for {custom_id}"
+                )
+
+        extracted = {}
+        for doc_id, groups in plans.items():
+            if doc_id in errors:
+                extracted[doc_id] = errors[doc_id]
+                continue
+            try:
+                results = [
+                    self.llm_processor.merge_responses(responses, fields)
+                    for fields, responses in groups
+                ]
+                extracted[doc_id] = (
+                    self.llm_processor.merge_field_groups(results)
+                    if use_field_groups
+                    else results[0]
+                )
+            except Exception as e:
+                extracted[doc_id] = e
+        return extracted
+
+    async def _run_batch(
+        self, input_jsonl: IO[bytes], request_count: int
+    ) -> Dict[str, Union[str, Exception]]:
+        input_jsonl.flush()
+        input_jsonl.seek(0)
+        input_file = await self.client.files.create(file=input_jsonl, purpose="batch")
+
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        logfire.info(f"Submitted batch {batch.id} with {request_count} requests")
+        metrics.increment("llm_requests", request_count)
+
+        with metrics.timed("llm_batch_wait", batch_id=batch.id):
+            while batch.status not in TERMINAL_STATUSES:
+                await asyncio.sleep(self.poll_interval_seconds)
+                batch = await self.client.batches.retrieve(batch.id)
+                logfire.info(f"Batch {batch.id} is {batch.status}")
+
+        if batch.status == "failed":
+            raise RuntimeError(f"Batch {batch.id} failed: {batch.errors}")
+
+        # Expired and cancelled batches still return their completed requests
+        results: Dict[str, Union[str, Exception]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                results.update(self._parse_results(content.text))
+        return results
+
+    @staticmethod
+    def _parse_results(jsonl: str) -> Dict[str, Union[str, Exception]]:
+        results = {}
+        for line in jsonl.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body", {}).get("error")
+                results[record["custom_id"]] = RuntimeError(
+                    f"Batch request {record['custom_id']} failed: {error}"
+                )
+            else:
+                body = response["body"]
+                results[record["custom_id"]] = body["choices"][0]["message"][
+                    "content"
+                ]
+                usage = body.get("usage") or {}
+                metrics.increment("llm_prompt_tokens", usage.get("prompt_tokens", 0))
+                metrics.increment(
+                    "llm_completion_tokens", usage.get("completion_tokens", 0)
+                )
+        return results
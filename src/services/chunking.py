@@ -0,0 +1,160 @@
+"""Token counting, chunking and merging for documents that exceed a request budget."""
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import logfire
+import tiktoken
+
+# Characters-per-token ratio used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for ``model``, or None if unavailable."""
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = "o200k_base"
+
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # Encodings are downloaded on first use and may be unreachable offline
+        logfire.warning(
+            f"tiktoken encoding {encoding_name} unavailable ({e}), estimating "
+            f"token counts as {CHARS_PER_TOKEN} characters per token"
+        )
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens of ``text``, estimating from its length without an encoding."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_text(
+    text: str, max_tokens: int, overlap_tokens: int, model: str
+) -> List[str]:
+    """Split ``text`` into chunks of at most ``max_tokens`` tokens.
+
+    Consecutive chunks share ``overlap_tokens`` tokens so that content cut at a
+    boundary is seen whole by at least one chunk.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return _split_by_chars(
+            text, max_tokens * CHARS_PER_TOKEN, overlap_tokens * CHARS_PER_TOKEN
+        )
+
+    tokens = encoding.encode(text, disallowed_special=())
+    step = max_tokens - overlap_tokens
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(encoding.decode(tokens[start : start + max_tokens]))
+        if start + max_tokens >= len(tokens):
+            break
+    return chunks
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Keep only the first ``max_tokens`` tokens of ``text``."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _split_by_chars(text: str, max_chars: int, overlap_chars: int) -> List[str]:
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Prefer to cut at a line break in the second half of the window
+            newline = text.rfind("\n", start + max_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        chunks.append(text[start:end])
+        if end >= len(text):
+            return chunks
+        start = max(end - overlap_chars, start + 1)
+
+
+def merge_extractions(
+    partials: List[Dict[str, Any]],
+    schema: Optional[Dict[str, Any]] = None,
+    strategies: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Merge the JSON extracted from each chunk into a single result.
+
+    Per field, the strategy is one of:
+        - ``first`` / ``last``: first or last non-empty value, in document order
+        - ``union``: concatenation of arrays without duplicates (default for arrays)
+        - ``concat``: distinct non-empty strings joined by blank lines (default
+          for everything else)
+    """
+    strategies = strategies or {}
+    properties = (schema or {}).get("properties") or {}
+    fields = list(properties) or list(
+        dict.fromkeys(field for partial in partials for field in partial)
+    )
+
+    merged = {}
+    for field in fields:
+        values = [
+            partial[field]
+            for partial in partials
+            if partial.get(field) not in (None, "", [], {})
+        ]
+        is_array = properties.get(field, {}).get("type") == "array" or (
+            bool(values) and isinstance(values[0], list)
+        )
+        if not values:
+            merged[field] = [] if is_array else None
+            continue
+
+        strategy = strategies.get(field, "union" if is_array else "concat")
+        if strategy == "first":
+            merged[field] = values[0]
+        elif strategy == "last":
+            merged[field] = values[-1]
+        elif strategy == "union":
+            merged[field] = _union(values)
+        elif strategy == "concat":
+            if all(isinstance(value, str) for value in values):
+                merged[field] = "\n\n".join(dict.fromkeys(values))
+            else:
+                merged[field] = values[0]
+        else:
+            raise ValueError(f"Unknown merge strategy '{strategy}' for {field}")
+
+    return merged
+
+
+def _union(values: List[Any]) -> List[Any]:
+    seen = set()
+    result = []
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            key = (
+                item.strip().lower()
+                if isinstance(item, str)
+                else json.dumps(item, sort_keys=True)
+            )
+            if key not in seen:
+                seen.add(key)
+                result.append(item)
+    return result
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import logfire
+
+# Bump to invalidate every entry written by an older layout of the cache
+CACHE_FORMAT_VERSION = 1
+# Eviction frees space down to this fraction of the cap, so that a full cache
+# is not listed and sorted again on every write
+EVICTION_LOW_WATER = 0.9
+
+
+class LLMResponseCache:
+    """Disk-backed cache of LLM responses with size-capped LRU eviction.
+
+    Entries are keyed by a hash of everything that determines the response:
+    model, prepared messages, response format and temperature. Editing a prompt
+    or schema therefore changes the key, and the stale entries simply age out
+    of the cache. Bumping ``cache_version`` in the prompt config invalidates
+    every entry for that prompt at once, and ``clear`` empties the cache.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size_bytes = sum(path.stat().st_size for path in self._entries())
+
+    def make_key(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        response_format: Dict[str, Any],
+        temperature: float,
+        cache_version: Any = None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "format_version": CACHE_FORMAT_VERSION,
+                "cache_version": cache_version,
+                "model": model,
+                "messages": messages,
+                "response_format": response_format,
+                "temperature": temperature,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                content = json.load(f)["content"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.misses += 1
+            return None
+
+        # Refresh mtime so eviction is least-recently-used, not oldest-written
+        os.utime(path)
+        self.hits += 1
+        return content
+
+    def set(self, key: str, content: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        previous_size = path.stat().st_size if path.exists() else 0
+
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"content": content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self._size_bytes += path.stat().st_size - previous_size
+        if self._size_bytes > self.max_size_bytes:
+            self._evict()
+
+    def clear(self) -> None:
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+        self._size_bytes = 0
+
+    def _evict(self) -> None:
+        """Remove least recently used entries down to the low-water mark."""
+        entries = sorted(
+            ((path.stat(), path) for path in self._entries()),
+            key=lambda entry: entry[0].st_mtime,
+        )
+        self._size_bytes = sum(stat.st_size for stat, _ in entries)
+
+        evicted = 0
+        for stat, path in entries:
+            if self._size_bytes <= self.max_size_bytes * EVICTION_LOW_WATER:
+                break
+            path.unlink(missing_ok=True)
+            self._size_bytes -= stat.st_size
+            evicted += 1
+
+        logfire.info(f"Evicted {evicted} LLM cache entries from {self.cache_dir}")
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.json")
+
+    def _path(self, key: str) -> Path:
+        # Fan out over sub-directories to keep directory listings small
+        return self.cache_dir / key[:2] / f"{key}.json"
@@ -1,19 +1,75 @@
 import json
 import logfire
-from typing import Dict, List, Any, Optional
-from openai import AzureOpenAI
+from typing import Dict, List, Any, Optional, Tuple
 import copy
-import time
 import asyncio
+import re
+import time
+
+from src.services.chunking import (
+    count_tokens,
+    merge_extractions,
+    split_text,
+    truncate_tokens,
+)
+from src.services.llm_cache import LLMResponseCache
+from src.services.rate_limiter import RateLimiter
+from src.services.retry import (
+    AdaptiveConcurrency,
+    backoff_delay,
+    is_overloaded,
+    is_retryable,
+    retry_after,
+)
+from src.utils import metrics
+
+# Completion tokens reserved per request until the real usage is known
+COMPLETION_TOKENS_ESTIMATE = 1000
+TEMPERATURE = 0
+# Tokens kept free for the "[Part i of n]" header added to each chunk
+CHUNK_HEADER_TOKENS = 16
 
 
 class LLMProcessor:
-    """Handles LLM requests to Azure OpenAI with configurable prompts."""
+    """Handles LLM requests to Azure OpenAI with configurable prompts.
+
+    Expects an async client (``AsyncAzureOpenAI``). Up to
+    ``max_concurrent_requests`` calls are kept in flight, within the
+    requests-per-minute and tokens-per-minute budget of the deployment.
+    Responses are served from ``cache`` when an identical request was made
+    before.
+
+    Throttled, timed out and server-failed requests are retried up to
+    ``max_retries`` times, after the endpoint's Retry-After or a jittered
+    exponential backoff. Throttling also lowers the number of requests kept
+    in flight until the endpoint recovers (see ``AdaptiveConcurrency``).
+    """
 
-    def __init__(self, client, config_prompt):
+    def __init__(
+        self,
+        client,
+        config_prompt,
+        max_concurrent_requests: int = 8,
+        requests_per_minute: int = 60,
+        tokens_per_minute: int = 90000,
+        cache: Optional[LLMResponseCache] = None,
+        max_retries: int = 6,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 60.0,
+    ):
         self.client = client
+        # Retried here under the shared concurrency limit; SDK retries would
+        # multiply the attempts and bypass it
+        self._completions = client.with_options(max_retries=0).chat.completions
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
         self.config_prompt = config_prompt
-        self.last_api_call_time = 0  # Timestamp dell'ultima chiamata API
+        self.cache = cache
+        # Azure OpenAI routes requests by deployment name rather than model
+        self.deployment = self.config_prompt.get("deployment", "gpt-4o")
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrent_requests)
 
         if "messages" not in self.config_prompt:
             raise ValueError("Config must contain 'messages' key")
@@ -24,39 +80,240 @@ class LLMProcessor:
             f"Initialized LLMProcessor with model: {self.config_prompt['model']}"
         )
 
+    async def extract(
+        self, text: str, fields_to_extract: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Extract structured data from ``text``, chunking it if needed.
+
+        When the prompt would exceed ``max_input_tokens`` from the prompt config,
+        the text is split into overlapping chunks that are extracted
+        concurrently and merged into a single result matching the schema.
+        """
+        chunks = self.prepare_chunks(text)
+        if len(chunks) > 1:
+            logfire.info(
+                f"Document exceeds the token ceiling, split into {len(chunks)} chunks"
+            )
+
+        responses = await asyncio.gather(
+            *(self.make_request(chunk, fields_to_extract) for chunk in chunks)
+        )
+        return self.merge_responses(responses, fields_to_extract)
+
+    async def extract_field_groups(self, text: str) -> Dict[str, Any]:
+        """Extract each configured field group concurrently and merge the results.
+
+        Each group only asks for its own fields and, where the group defines a
+        section, only sends that part of the document.
+        """
+        groups = self.field_group_requests(text)
+        results = await asyncio.gather(
+            *(self.extract(section, fields) for fields, section in groups)
+        )
+        return self.merge_field_groups(results)
+
+    def field_group_requests(self, text: str) -> List[Tuple[List[str], str]]:
+        """Split the extraction into (fields, document section) per field group.
+
+        Groups come from ``field_groups`` in the prompt config. A group may
+        narrow the text with ``section_pattern`` (a regex; the section starts at
+        its last match, or the whole text is used if there is none) and cap it
+        with ``max_section_tokens``. Schema fields not covered by any group are
+        requested together against the full text.
+        """
+        model = self.config_prompt["model"]
+        groups = []
+        for group in self.config_prompt.get("field_groups", []):
+            section = text
+            pattern = group.get("section_pattern")
+            if pattern:
+                matches = list(re.finditer(pattern, text))
+                if matches:
+                    section = text[matches[-1].start() :]
+            if group.get("max_section_tokens"):
+                section = truncate_tokens(section, group["max_section_tokens"], model)
+            groups.append((group["fields"], section))
+
+        grouped = {field for fields, _ in groups for field in fields}
+        remaining = [field for field in self._schema_fields() if field not in grouped]
+        if remaining:
+            groups.append((remaining, text))
+        return groups
+
+    def merge_field_groups(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine per-group results, ordering fields as in the schema."""
+        merged = {}
+        for result in results:
+            merged.update(result)
+
+        order = {field: i for i, field in enumerate(self._schema_fields())}
+        return dict(
+            sorted(merged.items(), key=lambda item: order.get(item[0], len(order)))
+        )
+
     async def make_request(self, text, fields_to_extract=None):
         try:
-            messages = self._prepare_messages(text)
-            if not messages:
-                raise ValueError("Failed to prepare messages")
+            request = self.build_request(text, fields_to_extract)
 
-            response_format = self._prepare_response_format(fields_to_extract)
+            cache_key = self.cache_key(request)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
 
-            # Controllo semplice per il rate limiting
-            current_time = time.time()
-            time_since_last_call = current_time - self.last_api_call_time
+            estimated_tokens = self._estimate_tokens(request["messages"])
+            response = await self._create_with_retries(request, estimated_tokens)
 
-            if time_since_last_call < 10:  # 10 secondi tra le chiamate
-                wait_time = 10 - time_since_last_call
-                logfire.info(f"Waiting {wait_time:.2f} seconds before next API call")
-                await asyncio.sleep(wait_time)
+            metrics.increment("llm_requests")
+            if response.usage:
+                self.rate_limiter.record_usage(
+                    estimated_tokens, response.usage.total_tokens
+                )
+                metrics.increment("llm_prompt_tokens", response.usage.prompt_tokens)
+                metrics.increment(
+                    "llm_completion_tokens", response.usage.completion_tokens
+                )
 
-            # Aggiorna il timestamp prima della chiamata
-            self.last_api_call_time = time.time()
+            content = response.choices[0].message.content
+            if cache_key:
+                self.cache.set(cache_key, content)
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                response_format=response_format,
-                temperature=0,
-            )
-
-            return response.choices[0].message.content
+            return content
 
         except Exception as e:
             logfire.error(f"Error in make_request: {str(e)}", exc_info=True)
             raise
 
+    async def _create_with_retries(
+        self, request: Dict[str, Any], estimated_tokens: int
+    ):
+        attempt = 0
+        while True:
+            # Queue wait covers the concurrency slot and the rate limit budget
+            queued = time.perf_counter()
+            async with self.concurrency.slot():
+                waited = await self.rate_limiter.acquire(estimated_tokens)
+                if waited:
+                    logfire.info(f"Waited {waited:.2f} seconds for rate limit budget")
+                metrics.record("llm_queue_wait", time.perf_counter() - queued)
+
+                try:
+                    with metrics.timed("llm_request", model=self.deployment):
+                        response = await self._completions.create(**request)
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    error, requested = e, retry_after(e)
+                    delay = backoff_delay(
+                        attempt,
+                        self.retry_base_seconds,
+                        self.retry_max_seconds,
+                        requested,
+                    )
+                    if is_overloaded(e):
+                        # Rejected requests use none of the budget they reserved
+                        self.rate_limiter.record_usage(estimated_tokens, 0)
+                        self.concurrency.overloaded(
+                            requested if requested is not None else delay
+                        )
+                        metrics.increment("llm_throttled")
+                else:
+                    self.concurrency.succeeded()
+                    return response
+
+            attempt += 1
+            metrics.increment("llm_retries")
+            logfire.warning(
+                f"Retrying request in {delay:.1f} seconds (attempt {attempt} of "
+                f"{self.max_retries}) after: {error}; concurrency limit "
+                f"{int(self.concurrency.limit)}"
+            )
+            await asyncio.sleep(delay)
+
+    def build_request(
+        self, text: str, fields_to_extract: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Build the chat completion request body for ``text``."""
+        messages = self._prepare_messages(text)
+        if not messages:
+            raise ValueError("Failed to prepare messages")
+
+        return {
+            "model": self.deployment,
+            "messages": messages,
+            "response_format": self._prepare_response_format(fields_to_extract),
+            "temperature": TEMPERATURE,
+        }
+
+    def cache_key(self, request: Dict[str, Any]) -> Optional[str]:
+        """Response cache key of a request, or None when caching is disabled."""
+        if not self.cache:
+            return None
+
+        return self.cache.make_key(
+            f"{self.config_prompt['model']}@{request['model']}",
+            request["messages"],
+            request["response_format"],
+            request["temperature"],
+            self.config_prompt.get("cache_version"),
+        )
+
+    def prepare_chunks(self, text: str) -> List[str]:
+        """Texts to send for one document: the whole text, or labelled chunks."""
+        chunks = self._split_into_chunks(text)
+        if len(chunks) == 1:
+            return chunks
+
+        return [
+            f"[Part {i} of {len(chunks)}]\n{chunk}"
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+
+    def merge_responses(
+        self, responses: List[str], fields_to_extract: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Parse the responses for a document's chunks into a single result."""
+        if len(responses) == 1:
+            return json.loads(responses[0])
+
+        response_format = self._prepare_response_format(fields_to_extract)
+        return merge_extractions(
+            [json.loads(response) for response in responses],
+            response_format.get("json_schema", {}).get("schema"),
+            self.config_prompt.get("merge_strategy"),
+        )
+
+    def _schema_fields(self):
+        response_format = self.config_prompt.get("response_format", {})
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        return list(schema.get("properties", {}))
+
+    def _estimate_tokens(self, messages):
+        prompt_tokens = sum(
+            count_tokens(message["content"], self.config_prompt["model"])
+            for message in messages
+        )
+        return prompt_tokens + COMPLETION_TOKENS_ESTIMATE
+
+    def _split_into_chunks(self, text):
+        max_input_tokens = self.config_prompt.get("max_input_tokens")
+        if not max_input_tokens:
+            return [text]
+
+        model = self.config_prompt["model"]
+        # Tokens left for the document once the prompt template is accounted for
+        template_tokens = sum(
+            count_tokens(message["content"].replace("{text}", ""), model)
+            for message in self.config_prompt["messages"]
+        )
+        budget = max_input_tokens - template_tokens - CHUNK_HEADER_TOKENS
+        if count_tokens(text, model) <= budget:
+            return [text]
+
+        return split_text(
+            text, budget, self.config_prompt.get("chunk_overlap_tokens", 0), model
+        )
+
     def _prepare_messages(self, text):
         try:
             if not text:
@@ -0,0 +1,455 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from enum import Enum
+from functools import partial
+from itertools import chain, islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import logfire
+import pypdfium2 as pdfium
+from unstructured.partition.pdf import partition_pdf
+
+
+ExtractionResult = Tuple[Path, Optional[Dict[str, Any]], Optional[Exception]]
+
+
+class ExtractionStrategy(str, Enum):
+    """How text is extracted from a PDF.
+
+    ``tiered`` reads the embedded text layer and only partitions pages with
+    too little text (scans, figures) with the OCR strategy. The others run
+    the matching ``unstructured`` strategy on the whole file.
+    """
+
+    TIERED = "tiered"
+    AUTO = "auto"
+    FAST = "fast"
+    HI_RES = "hi_res"
+    OCR_ONLY = "ocr_only"
+
+
+def extract_pdf(
+    pdf_path: str,
+    strategy: ExtractionStrategy = ExtractionStrategy.TIERED,
+    min_chars_per_page: int = 50,
+    ocr_strategy: str = "hi_res",
+) -> Dict[str, Any]:
+    """Extract the text content of a single PDF.
+
+    The strategy actually used and the time taken are recorded under
+    ``metadata``. Kept at module level so it can be pickled and run in a
+    worker process.
+    """
+    started = time.perf_counter()
+    if strategy == ExtractionStrategy.TIERED:
+        content, metadata = _extract_tiered(pdf_path, min_chars_per_page, ocr_strategy)
+    else:
+        elements = partition_pdf(filename=pdf_path, strategy=strategy.value)
+        content = "\n".join([str(el) for el in elements])
+        metadata = {"strategy": strategy.value}
+    metadata["extraction_seconds"] = round(time.perf_counter() - started, 3)
+
+    return {
+        "filename": Path(pdf_path).name,
+        "content": content,
+        "extraction_date": datetime.now().isoformat(),
+        "metadata": metadata,
+    }
+
+
+def _extract_tiered(
+    pdf_path: str, min_chars_per_page: int, ocr_strategy: str
+) -> Tuple[str, Dict[str, Any]]:
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        pages, metadata = _extract_tiered_pages(
+            pdf, pdf_path, list(range(len(pdf))), min_chars_per_page, ocr_strategy
+        )
+    finally:
+        pdf.close()
+    return "\n".join(pages), metadata
+
+
+def _extract_tiered_pages(
+    pdf,
+    pdf_path: str,
+    page_indices: List[int],
+    min_chars_per_page: int,
+    ocr_strategy: str,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Text of the given pages, OCRing those with too little text."""
+    pages = [_text_layer(pdf[index]) for index in page_indices]
+    sparse = [
+        position
+        for position, text in enumerate(pages)
+        if len(text.strip()) < min_chars_per_page
+    ]
+    if sparse:
+        sparse_pages = [page_indices[position] for position in sparse]
+        ocr_texts = _partition_pages(pdf, pdf_path, sparse_pages, ocr_strategy)
+        for position, index in zip(sparse, sparse_pages):
+            pages[position] = ocr_texts[index]
+
+    return pages, {
+        "strategy": _tiered_strategy(len(pages), len(sparse), ocr_strategy),
+        "page_count": len(pages),
+        "ocr_pages": [page_indices[position] + 1 for position in sparse],
+    }
+
+
+def _tiered_strategy(page_count: int, ocr_page_count: int, ocr_strategy: str) -> str:
+    if not ocr_page_count:
+        return "text_layer"
+    if ocr_page_count == page_count:
+        return ocr_strategy
+    return f"text_layer+{ocr_strategy}"
+
+
+def _text_layer(page) -> str:
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range().replace("\r\n", "\n")
+    finally:
+        textpage.close()
+        page.close()
+
+
+def _partition_pages(
+    pdf, pdf_path: str, page_indices: List[int], strategy: str
+) -> Dict[int, str]:
+    """Partition only the given pages, returning their text by page index."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(page_indices) == len(pdf):
+            subset_path = pdf_path
+        else:
+            subset_path = str(Path(tmp_dir) / Path(pdf_path).name)
+            subset = pdfium.PdfDocument.new()
+            subset.import_pages(pdf, page_indices)
+            subset.save(subset_path)
+            subset.close()
+
+        elements = partition_pdf(filename=subset_path, strategy=strategy)
+
+    texts: Dict[int, List[str]] = {index: [] for index in page_indices}
+    for element in elements:
+        # Page numbers are 1-based within the subset
+        page_number = element.metadata.page_number or 1
+        texts[page_indices[page_number - 1]].append(str(element))
+    return {index: "\n".join(parts) for index, parts in texts.items()}
+
+
+def extract_pdf_pages(
+    pdf_path: str,
+    first_page: int,
+    last_page: int,
+    output_path: str,
+    strategy: ExtractionStrategy = ExtractionStrategy.TIERED,
+    min_chars_per_page: int = 50,
+    ocr_strategy: str = "hi_res",
+) -> Dict[str, Any]:
+    """Extract pages ``first_page`` to ``last_page`` (0-based, exclusive).
+
+    The text is written to ``output_path`` rather than returned, so the ranges
+    of a large PDF can be extracted by separate workers and streamed out in
+    order without being held in memory together. Returns the metadata of the
+    range.
+    """
+    started = time.perf_counter()
+    page_indices = list(range(first_page, last_page))
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        if strategy == ExtractionStrategy.TIERED:
+            pages, metadata = _extract_tiered_pages(
+                pdf, pdf_path, page_indices, min_chars_per_page, ocr_strategy
+            )
+        else:
+            texts = _partition_pages(pdf, pdf_path, page_indices, strategy.value)
+            pages = [texts[index] for index in page_indices]
+            metadata = {"strategy": strategy.value, "page_count": len(pages)}
+    finally:
+        pdf.close()
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for position, text in enumerate(pages):
+            if position:
+                f.write("\n")
+            f.write(text)
+    metadata["extraction_seconds"] = round(time.perf_counter() - started, 3)
+    return metadata
+
+
+class PageRangeText:
+    """Text of a PDF extracted range by range into part files.
+
+    Iterating yields the text in chunks, joining ranges with a newline like
+    pages within a range, so it can be streamed to the output file (see
+    ``StorageResource.write_json``).
+    """
+
+    def __init__(self, part_paths: List[Path], chunk_size: int = 1024 * 1024):
+        self.part_paths = part_paths
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[str]:
+        for index, path in enumerate(self.part_paths):
+            if index:
+                yield "\n"
+            with open(path, encoding="utf-8") as f:
+                yield from iter(lambda: f.read(self.chunk_size), "")
+
+    def __str__(self) -> str:
+        return "".join(self)
+
+
+def page_ranges(page_count: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    """Split ``page_count`` pages into consecutive ranges of ``pages_per_task``."""
+    return [
+        (first, min(first + pages_per_task, page_count))
+        for first in range(0, page_count, pages_per_task)
+    ]
+
+
+def _merge_range_metadata(
+    ranges: List[Dict[str, Any]], strategy: ExtractionStrategy, ocr_strategy: str
+) -> Dict[str, Any]:
+    page_count = sum(metadata["page_count"] for metadata in ranges)
+    # Worker time summed over the ranges, which may have run in parallel
+    seconds = round(sum(metadata["extraction_seconds"] for metadata in ranges), 3)
+    if strategy != ExtractionStrategy.TIERED:
+        return {
+            "strategy": strategy.value,
+            "page_count": page_count,
+            "extraction_seconds": seconds,
+        }
+
+    ocr_pages = [page for metadata in ranges for page in metadata["ocr_pages"]]
+    return {
+        "strategy": _tiered_strategy(page_count, len(ocr_pages), ocr_strategy),
+        "page_count": page_count,
+        "ocr_pages": ocr_pages,
+        "extraction_seconds": seconds,
+    }
+
+
+def _page_count(pdf_path: Path) -> int:
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def resolve_worker_count(
+    max_workers: Optional[int], file_count: int, split_pages: bool = False
+) -> int:
+    """Number of worker processes to use at most.
+
+    Never more than there are files, unless large files are split into page
+    ranges, in which case even a single file can keep every worker busy.
+    The pool of ``extract_pdfs`` only starts workers for the tasks it gets.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if split_pages:
+        return max(1, workers)
+    return max(1, min(workers, file_count))
+
+
+class _PendingFile:
+    """Tasks of one PDF: the whole file, or one per page range."""
+
+    def __init__(self, pdf_file: Path, part_paths: Optional[List[Path]] = None):
+        self.pdf_file = pdf_file
+        self.part_paths = part_paths
+        self.results: Dict[int, Any] = {}
+        self.error: Optional[Exception] = None
+
+
+def extract_pdfs(
+    pdf_files: Iterable[Path],
+    max_workers: int,
+    batch_size: int,
+    strategy: ExtractionStrategy = ExtractionStrategy.TIERED,
+    min_chars_per_page: int = 50,
+    ocr_strategy: str = "hi_res",
+    pages_per_task: Optional[int] = None,
+) -> Iterator[ExtractionResult]:
+    """Extract PDFs, yielding (pdf_file, doc_data, error) as each one completes.
+
+    ``pdf_files`` is consumed lazily, so it may be a generator producing files
+    as they become available (see ``PDFPrefetcher``).
+
+    With a single worker the files are processed in-process. Otherwise they are
+    fanned out over a process pool, which starts at most one worker per task,
+    keeping at most ``max(batch_size, max_workers)`` tasks in flight so results are
+    consumed as they arrive instead of piling up in memory. A failure in one
+    file never affects the others: its exception is yielded alongside the
+    file. When a worker dies (killed for memory, crashed), the files it shared
+    the pool with fail with ``BrokenProcessPool`` and the pool is restarted
+    for the rest.
+
+    With ``pages_per_task``, PDFs with more pages are split into ranges of
+    that many pages, extracted as separate tasks so one huge file is spread
+    over several workers. Their ``content`` is a ``PageRangeText`` backed by
+    temporary files, valid only until the next result is requested.
+    """
+    extract = partial(
+        extract_pdf,
+        strategy=strategy,
+        min_chars_per_page=min_chars_per_page,
+        ocr_strategy=ocr_strategy,
+    )
+    extract_pages = partial(
+        extract_pdf_pages,
+        strategy=strategy,
+        min_chars_per_page=min_chars_per_page,
+        ocr_strategy=ocr_strategy,
+    )
+    tmp_dir = Path(tempfile.mkdtemp(prefix="pdf_pages_"))
+
+    def plan(index: int, pdf_file: Path) -> Tuple[_PendingFile, List[tuple]]:
+        """The file's pending state and the (function, *args) of its tasks."""
+        try:
+            page_count = _page_count(pdf_file) if pages_per_task else 0
+        except Exception:
+            # Unreadable here: let the whole-file task report the error
+            page_count = 0
+        if page_count <= (pages_per_task or 0):
+            return _PendingFile(pdf_file), [(extract, str(pdf_file))]
+
+        ranges = page_ranges(page_count, pages_per_task)
+        part_paths = [tmp_dir / str(index) / f"{first}.txt" for first, _ in ranges]
+        part_paths[0].parent.mkdir()
+        tasks = [
+            (extract_pages, str(pdf_file), first, last, str(part_path))
+            for (first, last), part_path in zip(ranges, part_paths)
+        ]
+        return _PendingFile(pdf_file, part_paths), tasks
+
+    def finish(pending_file: _PendingFile) -> Iterator[ExtractionResult]:
+        pdf_file, part_paths = pending_file.pdf_file, pending_file.part_paths
+        if pending_file.error is not None:
+            yield pdf_file, None, pending_file.error
+        elif part_paths is None:
+            yield pdf_file, pending_file.results[0], None
+        else:
+            ranges = [pending_file.results[index] for index in range(len(part_paths))]
+            yield pdf_file, {
+                "filename": pdf_file.name,
+                "content": PageRangeText(part_paths),
+                "extraction_date": datetime.now().isoformat(),
+                "metadata": _merge_range_metadata(ranges, strategy, ocr_strategy),
+            }, None
+        if part_paths is not None:
+            shutil.rmtree(part_paths[0].parent, ignore_errors=True)
+
+    planned_files = (plan(*next_file) for next_file in enumerate(pdf_files))
+    if max_workers > 1:
+        # A lone whole-file task runs in-process. Otherwise the pool starts
+        # workers as tasks are submitted, so fewer tasks get fewer workers
+        head = list(islice(planned_files, 1))
+        if head and len(head[0][1]) == 1:
+            head += islice(planned_files, 1)
+        if sum(len(tasks) for _, tasks in head) < 2:
+            max_workers = 1
+        planned_files = chain(head, planned_files)
+
+    try:
+        if max_workers <= 1:
+            for pending_file, tasks in planned_files:
+                try:
+                    for task_index, (function, *args) in enumerate(tasks):
+                        pending_file.results[task_index] = function(*args)
+                except Exception as e:
+                    pending_file.error = e
+                yield from finish(pending_file)
+            return
+
+        in_flight = max(batch_size, max_workers)
+
+        def new_executor() -> ProcessPoolExecutor:
+            # spawn rather than fork: the Dagster run worker is multi-threaded
+            return ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=get_context("spawn")
+            )
+
+        executor = new_executor()
+        pending: Dict[Any, Tuple[_PendingFile, int, int]] = {}
+        # Files whose every task has a result or an error, to be yielded
+        finished: List[_PendingFile] = []
+
+        def complete(
+            pending_file: _PendingFile,
+            task_index: int,
+            task_count: int,
+            result: Any = None,
+            error: Optional[Exception] = None,
+        ) -> None:
+            pending_file.results[task_index] = result
+            if error is not None:
+                pending_file.error = pending_file.error or error
+            if len(pending_file.results) == task_count:
+                finished.append(pending_file)
+
+        def restart(error: BrokenProcessPool) -> None:
+            """Fail the tasks in flight on a dead worker's pool, then replace it."""
+            nonlocal executor
+            logfire.warning(
+                f"Extraction worker died, failing {len(pending)} task(s) in flight "
+                f"and restarting the pool: {error}"
+            )
+            executor.shutdown(wait=False, cancel_futures=True)
+            for entry in pending.values():
+                complete(*entry, error=error)
+            pending.clear()
+            executor = new_executor()
+
+        def fill() -> None:
+            while len(pending) < in_flight:
+                next_planned = next(planned_files, None)
+                if next_planned is None:
+                    return
+                pending_file, tasks = next_planned
+                for task_index, (function, *args) in enumerate(tasks):
+                    try:
+                        future = executor.submit(function, *args)
+                    except BrokenProcessPool as e:
+                        restart(e)
+                        future = executor.submit(function, *args)
+                    pending[future] = (pending_file, task_index, len(tasks))
+
+        def drain() -> Iterator[ExtractionResult]:
+            while finished:
+                yield from finish(finished.pop(0))
+
+        try:
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = None
+                for future in done:
+                    entry = pending.pop(future)
+                    try:
+                        complete(*entry, result=future.result())
+                    except BrokenProcessPool as e:
+                        # A worker was killed (OOM, segfault): the whole pool
+                        # is unusable
+                        broken = e
+                        complete(*entry, error=e)
+                    except Exception as e:
+                        complete(*entry, error=e)
+                if broken is not None:
+                    restart(broken)
+                yield from drain()
+                fill()
+                yield from drain()
+        finally:
+            executor.shutdown(cancel_futures=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
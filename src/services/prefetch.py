@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.resources.storage import StorageResource, StorageType
+from src.types.storage import FileInfo
+
+
+class PDFPrefetcher:
+    """Downloads upcoming source files while earlier ones are being extracted.
+
+    Iterating yields a local path per file, in order. Up to ``prefetch_count``
+    downloads run ahead in background threads, so network I/O overlaps with
+    the CPU-bound extraction of the files already yielded. Files already on
+    local storage are yielded in place. Downloaded copies live in a temporary
+    directory until ``release``d or until the prefetcher is closed; download
+    failures are collected in ``errors`` rather than interrupting the others.
+    """
+
+    def __init__(
+        self, storage: StorageResource, files: List[FileInfo], prefetch_count: int = 4
+    ):
+        self.storage = storage
+        self.files = files
+        self.prefetch_count = max(1, prefetch_count)
+        self.errors: List[Tuple[FileInfo, Exception]] = []
+        self._sources: Dict[Path, FileInfo] = {}
+        self._tmp_dir: Optional[Path] = None
+
+    def __enter__(self) -> "PDFPrefetcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Path]:
+        if self.storage.storage_type == StorageType.LOCAL:
+            for info in self.files:
+                local_path = self.storage.get_local_path(info.path)
+                self._sources[local_path] = info
+                yield local_path
+            return
+
+        self._tmp_dir = Path(tempfile.mkdtemp(prefix="pdf_prefetch_"))
+        remaining = iter(enumerate(self.files))
+        with ThreadPoolExecutor(max_workers=self.prefetch_count) as executor:
+
+            def submit(index: int, info: FileInfo):
+                # One sub-directory per file keeps the original file name
+                local_path = self._tmp_dir / str(index) / Path(info.path).name
+                future = executor.submit(
+                    self.storage.download_to_path, info.path, local_path
+                )
+                return info, local_path, future
+
+            pending = deque(
+                submit(index, info)
+                for index, info in islice(remaining, self.prefetch_count)
+            )
+            while pending:
+                info, local_path, future = pending.popleft()
+                # Keep the queue full before handing the file over
+                for index, next_info in islice(remaining, 1):
+                    pending.append(submit(index, next_info))
+
+                try:
+                    future.result()
+                except Exception as e:
+                    self.errors.append((info, e))
+                    continue
+
+                self._sources[local_path] = info
+                yield local_path
+
+    def source(self, local_path: Path) -> FileInfo:
+        """The stored file a yielded local path was fetched from."""
+        return self._sources[local_path]
+
+    def release(self, local_path: Path) -> None:
+        """Delete the downloaded copy of a file once it has been extracted."""
+        self._sources.pop(local_path, None)
+        if self._tmp_dir is not None and self._tmp_dir in local_path.parents:
+            shutil.rmtree(local_path.parent, ignore_errors=True)
+
+    def close(self) -> None:
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
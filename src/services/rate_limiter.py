@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket that refills continuously up to ``capacity``."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        if capacity <= 0 or refill_per_second <= 0:
+            raise ValueError("capacity and refill_per_second must be positive")
+
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.refill_per_second,
+        )
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Wait until ``amount`` tokens are available and take them.
+
+        Waiters are served in arrival order. Returns the seconds spent waiting.
+        """
+        # A single request larger than the bucket could never be served
+        amount = min(amount, self.capacity)
+        waited = 0.0
+
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                delay = (amount - self._tokens) / self.refill_per_second
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= amount
+
+        return waited
+
+    def adjust(self, amount: float) -> None:
+        """Take (positive) or return (negative) tokens after the fact.
+
+        The balance may go negative, in which case later callers wait it off.
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget for one LLM deployment."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """Reserve budget for one request. Returns the seconds spent waiting."""
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Reconcile the token budget with the usage reported by the API."""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
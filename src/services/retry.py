@@ -0,0 +1,127 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+import openai
+
+# Statuses worth retrying: timeouts, conflicts, throttling and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# Statuses meaning the endpoint is saturated rather than the request failing
+OVERLOADED_STATUS_CODES = {429, 503}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed API call may succeed when made again."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS_CODES or status >= 500)
+
+
+def is_overloaded(error: Exception) -> bool:
+    return getattr(error, "status_code", None) in OVERLOADED_STATUS_CODES
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the endpoint asked to wait before retrying, if it said so.
+
+    Reads ``retry-after-ms`` (sent by Azure OpenAI) and ``Retry-After`` in
+    seconds or as an HTTP date.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int,
+    base_seconds: float = 1.0,
+    max_seconds: float = 60.0,
+    requested: Optional[float] = None,
+) -> float:
+    """Seconds to wait before retry number ``attempt`` (from 0).
+
+    Uses exponential backoff with full jitter, or the ``requested`` wait
+    (Retry-After) plus up to ``base_seconds`` of jitter so that requests
+    throttled together do not all retry at the same instant.
+    """
+    if requested is not None:
+        return requested + random.uniform(0, base_seconds)
+    return random.uniform(0, min(max_seconds, base_seconds * 2**attempt))
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit that backs off while the endpoint is saturated.
+
+    Used like a semaphore of up to ``max_limit`` slots. When a request is
+    throttled the circuit opens: no new request starts until the wait the
+    endpoint asked for has passed, and the limit is halved (once per
+    opening, however many in-flight requests report it). Each success grows
+    the limit by ``1 / limit``, about one slot per round of requests, back up
+    to ``max_limit``.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        if max_limit < 1 or not 1 <= min_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= max_limit")
+
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._open_until = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one slot, waiting for the circuit to close and a slot to free."""
+        async with self._condition:
+            while True:
+                pause = self._open_until - time.monotonic()
+                if pause <= 0 and self._in_flight < int(self.limit):
+                    break
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait(), pause if pause > 0 else None
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self._in_flight += 1
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def succeeded(self) -> None:
+        self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def overloaded(self, wait_seconds: float) -> None:
+        """Open the circuit for ``wait_seconds`` and lower the limit."""
+        now = time.monotonic()
+        if now >= self._open_until:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+        self._open_until = max(self._open_until, now + wait_seconds)
@@ -1,10 +1,10 @@
 import os
-import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 from dagster import get_dagster_logger
 
+from src.services.llm_cache import LLMResponseCache
 from src.services.llm_processor import LLMProcessor
 
 load_dotenv()
@@ -12,39 +12,81 @@ load_dotenv()
 logger = get_dagster_logger()
 
 
-async def process_content(
-    source_url: str, content_text: str, llm_config: Dict[str, Any]
-) -> Dict[str, Any]:
+def build_llm_processor(
+    llm_config: Dict[str, Any],
+    max_concurrent_requests: int = 8,
+    requests_per_minute: int = 60,
+    tokens_per_minute: int = 90000,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: int = 1024**3,
+    max_retries: int = 6,
+) -> LLMProcessor:
     """
-    Process job posting content using LLM to extract structured information.
+    Create an LLMProcessor backed by an async Azure OpenAI client.
+
+    A single processor should be shared by all documents of a run so that they
+    draw from the same concurrency and rate limit budget.
 
     Args:
-        source_url (str): The URL of the job posting
-        content_text (str): The extracted text content from the job posting
         llm_config (Dict[str, Any]): Configuration for the LLM processing
+        max_concurrent_requests (int): Maximum number of requests in flight
+        requests_per_minute (int): Request budget of the deployment
+        tokens_per_minute (int): Token budget of the deployment
+        cache_dir (str, optional): Directory of the response cache. None disables it
+        cache_max_bytes (int): Size cap of the response cache
+        max_retries (int): Retries of a throttled or failed request
 
     Returns:
-        Dict[str, Any]: Structured job details in JSON format
+        LLMProcessor: Processor ready to make requests
     """
 
-    logger.info(f"Processing job content from URL: {source_url}")
-
-    logger.debug(f"Content text: {content_text}")
-
     logger.debug(f"LLM config: {llm_config}")
 
     # Initialize Azure OpenAI client
-    client = AzureOpenAI(
+    client = AsyncAzureOpenAI(
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         api_version="2024-12-01-preview",
     )
 
-    llm_processor = LLMProcessor(client, llm_config)
+    return LLMProcessor(
+        client,
+        llm_config,
+        max_concurrent_requests=max_concurrent_requests,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        cache=LLMResponseCache(cache_dir, cache_max_bytes) if cache_dir else None,
+        max_retries=max_retries,
+    )
 
-    response_content = await llm_processor.make_request(content_text)
 
-    job_details = json.loads(response_content)
+async def process_content(
+    source_url: str,
+    content_text: str,
+    llm_processor: LLMProcessor,
+    use_field_groups: bool = False,
+) -> Dict[str, Any]:
+    """
+    Process job posting content using LLM to extract structured information.
+
+    Args:
+        source_url (str): The URL of the job posting
+        content_text (str): The extracted text content from the job posting
+        llm_processor (LLMProcessor): Processor used to make the request
+        use_field_groups (bool): Request the configured field groups separately
+
+    Returns:
+        Dict[str, Any]: Structured job details in JSON format
+    """
+
+    logger.info(f"Processing job content from URL: {source_url}")
+
+    logger.debug(f"Content text: {content_text}")
+
+    if use_field_groups:
+        job_details = await llm_processor.extract_field_groups(content_text)
+    else:
+        job_details = await llm_processor.extract(content_text)
 
     logger.info(f"Successfully processed job content from {source_url}")
     return job_details
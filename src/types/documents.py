@@ -22,6 +22,20 @@ class ExtractedDocument(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
+class DocumentReference(BaseModel):
+    """Lightweight pointer to a document stored through StorageResource.
+
+    Passed between assets instead of the document content, which is loaded
+    lazily from ``path`` when needed.
+    """
+
+    filename: str
+    path: str
+    sha256: str
+    size_bytes: int
+    extraction_date: Optional[str] = None
+
+
 class StructuredDocument(BaseModel):
     """Represents a document with structured data extracted."""
 
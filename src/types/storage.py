@@ -0,0 +1,15 @@
+# src/types/storage.py
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class FileInfo(BaseModel):
+    """A file listed from storage, with the metadata needed to detect changes."""
+
+    path: str
+    size_bytes: int
+    last_modified: datetime
+    # S3 ETag (quotes stripped); None for local files
+    etag: Optional[str] = None
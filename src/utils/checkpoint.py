@@ -0,0 +1,57 @@
+"""Checkpoint of finished results, used to resume an interrupted run."""
+
+from typing import Any, Dict, Optional
+
+from src.resources.storage import StorageResource
+
+
+class ResultCheckpoint:
+    """Records every result written, with the input and config it came from.
+
+    Each document has its own small entry file under ``checkpoint_folder``,
+    holding the SHA-256 of the source document and the key of the config
+    that produced the result, so a result is only reused for the same input
+    and prompt. Entries are written through ``StorageResource`` as results
+    finish, so a crashed run loses none and concurrent runs never rewrite
+    each other's entries. Methods block on storage: call them from a thread
+    in async code.
+    """
+
+    def __init__(self, storage: StorageResource, checkpoint_folder: str):
+        self.storage = storage
+        self.checkpoint_folder = checkpoint_folder
+
+    def get(
+        self, document_id: str, source_sha256: str, config_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """Reference of the document's finished result, if it is still valid."""
+        entry_file = self._entry_file(document_id)
+        if not self.storage.exists(entry_file):
+            return None
+        entry = self.storage.read_json(entry_file)
+        if (
+            entry.get("source_sha256") != source_sha256
+            or entry.get("config_key") != config_key
+            or not self.storage.exists(entry["reference"]["path"])
+        ):
+            return None
+        return entry["reference"]
+
+    def record(
+        self,
+        document_id: str,
+        source_sha256: str,
+        config_key: str,
+        reference: Dict[str, Any],
+    ) -> None:
+        self.storage.write_json(
+            self._entry_file(document_id),
+            {
+                "source_sha256": source_sha256,
+                "config_key": config_key,
+                "reference": reference,
+            },
+        )
+
+    def _entry_file(self, document_id: str) -> str:
+        return f"{self.checkpoint_folder}/{document_id}.json"
@@ -0,0 +1,49 @@
+"""Merging of the small Parquet files staged by per-document loads."""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import PurePosixPath
+from typing import Dict, List
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.resources.storage import StorageResource
+
+
+def compact_partitions(
+    storage: StorageResource, folder: str, min_age: timedelta = timedelta(hours=1)
+) -> Dict[str, int]:
+    """Merge the Parquet files of each partition folder under ``folder``.
+
+    Every partition (e.g. ``load_date=2025-01-31``) holding several files
+    gets one ``compacted-<id>.parquet`` with all their rows, then the merged
+    files are deleted. Files younger than ``min_age`` are left for later, as
+    the load that staged them may still be reading them. Columns added over
+    time are merged, missing values becoming null. Returns the number of
+    files merged per partition folder.
+    """
+    cutoff = datetime.now(timezone.utc) - min_age
+    by_partition: Dict[str, List[str]] = {}
+    for info in storage.iter_files(folder, ".parquet"):
+        if info.last_modified <= cutoff:
+            partition = str(PurePosixPath(info.path).parent)
+            by_partition.setdefault(partition, []).append(info.path)
+
+    merged = {}
+    for partition, paths in sorted(by_partition.items()):
+        if len(paths) < 2:
+            continue
+        tables = []
+        for path in sorted(paths):
+            with storage.open_read(path) as f:
+                tables.append(pq.read_table(f))
+        storage.write_parquet(
+            f"{partition}/compacted-{uuid4().hex}.parquet",
+            pa.concat_tables(tables, promote_options="default"),
+        )
+        # Readers may briefly see rows twice; they keep the latest anyway
+        for path in paths:
+            storage.delete_file(path)
+        merged[partition] = len(paths)
+    return merged
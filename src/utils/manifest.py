@@ -0,0 +1,125 @@
+"""Content manifest used to skip re-extracting unchanged files."""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.resources.storage import StorageResource
+from src.types.storage import FileInfo
+
+
+def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 of a file without loading it all into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionManifest:
+    """Records the size, mtime, ETag and SHA-256 of every extracted source file.
+
+    A file is considered unchanged when its size matches the manifest and
+    either its ETag (S3) or its mtime matches. A local file touched since
+    (e.g. re-copied) is also unchanged if its content digest still matches.
+    Entries are keyed by the source path relative to the input folder, and
+    each is its own small file under ``manifest_folder``, read and written
+    through ``StorageResource`` as documents are checked and extracted, so a
+    run only touches the entries of its own files.
+
+    ``settings`` (e.g. the extraction strategy) are recorded with every
+    entry, and a file extracted with other settings is never unchanged.
+    """
+
+    def __init__(
+        self,
+        storage: StorageResource,
+        manifest_folder: str,
+        settings: Optional[Dict[str, Any]] = None,
+    ):
+        self.storage = storage
+        self.manifest_folder = manifest_folder
+        self.settings = settings or {}
+        self._entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._digests: Dict[str, str] = {}
+
+    def is_unchanged(
+        self, key: str, source: FileInfo, local_path: Optional[Path] = None
+    ) -> bool:
+        """Check whether ``source`` still matches its manifest entry.
+
+        ``local_path`` is only read to compare digests when a local file's
+        mtime changed.
+        """
+        entry = self.get(key)
+        if (
+            not entry
+            or entry.get("settings", {}) != self.settings
+            or source.size_bytes != entry.get("size")
+        ):
+            return False
+        if source.etag:
+            return source.etag == entry.get("etag")
+
+        last_modified = source.last_modified.isoformat()
+        if last_modified == entry.get("last_modified"):
+            return True
+        if local_path is None:
+            return False
+
+        # Touched but possibly identical (e.g. re-copied): compare content
+        if self._digest(key, local_path) != entry.get("sha256"):
+            return False
+        entry["last_modified"] = last_modified
+        self._write(key, entry)
+        return True
+
+    def record(
+        self,
+        key: str,
+        source: FileInfo,
+        local_path: Path,
+        reference: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record a successful extraction of ``source``.
+
+        ``local_path`` is the copy that was extracted. ``reference`` describes
+        the output so that it can be passed on later without being read again.
+        """
+        self._write(
+            key,
+            {
+                "size": source.size_bytes,
+                "last_modified": source.last_modified.isoformat(),
+                "etag": source.etag,
+                "sha256": self._digest(key, local_path),
+                "reference": reference,
+                "settings": self.settings,
+            },
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._entries:
+            entry_file = self._entry_file(key)
+            self._entries[key] = (
+                self.storage.read_json(entry_file)
+                if self.storage.exists(entry_file)
+                else None
+            )
+        return self._entries[key]
+
+    def _write(self, key: str, entry: Dict[str, Any]) -> None:
+        self.storage.write_file(
+            self._entry_file(key), json.dumps(entry, indent=2, sort_keys=True)
+        )
+        self._entries[key] = entry
+
+    def _entry_file(self, key: str) -> str:
+        return f"{self.manifest_folder}/{key}.json"
+
+    def _digest(self, key: str, local_path: Path) -> str:
+        if key not in self._digests:
+            self._digests[key] = file_digest(local_path)
+        return self._digests[key]
@@ -0,0 +1,103 @@
+"""Timings and counters of an asset run, summarized into asset metadata."""
+
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import logfire
+from dagster import MetadataValue
+
+
+class RunMetrics:
+    """Collects the durations and counts recorded during one asset run.
+
+    Durations are kept per name and summarized as percentiles; counters are
+    summed. Recording is thread-safe, so storage calls made from worker
+    threads are included.
+    """
+
+    def __init__(self):
+        self._durations: Dict[str, List[float]] = defaultdict(list)
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[name].append(seconds)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Asset metadata: a percentile summary per duration, counters as is."""
+        with self._lock:
+            metadata: Dict[str, Any] = {
+                f"{name}_seconds": MetadataValue.json(summarize(values))
+                for name, values in sorted(self._durations.items())
+            }
+            for name, value in sorted(self._counters.items()):
+                metadata[name] = (
+                    MetadataValue.int(int(value))
+                    if float(value).is_integer()
+                    else MetadataValue.float(value)
+                )
+        return metadata
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Count, total and nearest-rank percentiles of durations in seconds."""
+    ordered = sorted(values)
+
+    def percentile(fraction: float) -> float:
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+    return {
+        "count": len(ordered),
+        "total": round(sum(ordered), 4),
+        "p50": round(percentile(0.5), 4),
+        "p90": round(percentile(0.9), 4),
+        "p99": round(percentile(0.99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+# Collector of the asset step running in this process. Dagster executes one
+# step at a time per process, so a module-level collector is also visible to
+# the worker threads resources use
+_active: Optional[RunMetrics] = None
+
+
+@contextmanager
+def collect_metrics() -> Iterator[RunMetrics]:
+    """Record the metrics of everything run inside the block."""
+    global _active
+    previous, _active = _active, RunMetrics()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@contextmanager
+def timed(name: str, **attributes: Any) -> Iterator[None]:
+    """Time the block as a logfire span and, when collecting, as ``name``."""
+    started = time.perf_counter()
+    try:
+        with logfire.span(name, **attributes):
+            yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def record(name: str, seconds: float) -> None:
+    if _active is not None:
+        _active.record(name, seconds)
+
+
+def increment(name: str, value: float = 1) -> None:
+    if _active is not None:
+        _active.increment(name, value)
@@ -0,0 +1,217 @@
+"""MinHash/LSH index used to reuse the results of near-duplicate documents."""
+
+import re
+import zlib
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.resources.storage import StorageResource
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def minhash_signature(
+    text: str,
+    num_perm: int = 128,
+    shingle_size: int = 5,
+    seed: int = 1,
+    block_size: int = 8192,
+) -> Optional[np.ndarray]:
+    """MinHash signature of the word ``shingle_size``-grams of ``text``.
+
+    The fraction of equal values in two signatures estimates the Jaccard
+    similarity of the two texts. Shingles are hashed in blocks of
+    ``block_size`` so memory stays bounded for very long documents. Returns
+    None for text without any words.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+
+    # Combine consecutive word hashes into one hash per shingle; short texts
+    # become a single shingle
+    width = min(shingle_size, len(hashes))
+    shingles = np.zeros(len(hashes) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        window = hashes[offset : offset + len(shingles)]
+        shingles = shingles * np.uint64(1000003) + window
+    shingles = np.unique(shingles & _MAX_HASH)
+
+    a, b = _permutations(num_perm, seed)
+    signature = np.full(num_perm, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(shingles), block_size):
+        block = shingles[start : start + block_size, np.newaxis]
+        permuted = ((block * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+        signature = np.minimum(signature, permuted.min(axis=0))
+    return signature.astype(np.uint32)
+
+
+def lsh_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Split ``num_perm`` values into (bands, rows per band) for LSH.
+
+    Picks the most selective split that still makes a pair at ``threshold``
+    a candidate with at least 99% probability; candidates are verified
+    against their full signatures, so a looser split only costs comparisons.
+    """
+    for rows in range(num_perm, 0, -1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold**rows) ** bands >= 0.99:
+            return bands, rows
+    return num_perm, 1
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of processed documents, bucketed for LSH lookups.
+
+    Each entry maps a document to the path of its structured result and the
+    key of the extraction config that produced it, so results are only
+    reused between runs of the same prompt. Entries are stored through
+    ``StorageResource`` under ``index_folder``, one file per document, and
+    each LSH bucket a document falls in gets a small marker file under
+    ``buckets/``. A query lists only the buckets of its signature's bands and
+    saving writes only the run's own documents, so neither grows with the
+    corpus and concurrent runs never rewrite each other's files.
+
+    Buckets depend on the MinHash parameters and the banding picked for the
+    threshold; documents indexed with other ones are found again once
+    reprocessed.
+    """
+
+    def __init__(
+        self,
+        storage: StorageResource,
+        index_folder: str,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        self.storage = storage
+        self.index_folder = index_folder
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self.bucket_folder = (
+            f"{index_folder}/buckets/"
+            f"{num_perm}-{shingle_size}-{seed}-{self.bands}x{self.rows}"
+        )
+
+        # Entries added by this run: (config key, result path, signature)
+        self._added: Dict[str, Tuple[str, str, np.ndarray]] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._removed: Set[str] = set()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        return minhash_signature(text, self.num_perm, self.shingle_size, self.seed)
+
+    def query(
+        self,
+        signature: np.ndarray,
+        config_key: str,
+        exclude: Optional[str] = None,
+    ) -> Optional[Tuple[str, str, float]]:
+        """Most similar document at or above the threshold, if any.
+
+        Returns (document id, result path, estimated similarity). ``exclude``
+        skips a document, typically the one being queried for.
+        """
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets.get((band, key), ()))
+            bucket = f"{self.bucket_folder}/{band}/{key.hex()}"
+            candidates.update(
+                PurePosixPath(path).name for path in self.storage.list_files(bucket)
+            )
+
+        best = None
+        for document_id in candidates:
+            if document_id == exclude or document_id in self._removed:
+                continue
+            entry = self._added.get(document_id) or self._read_entry(document_id)
+            if entry is None or entry[0] != config_key:
+                continue
+            similarity = float(np.mean(entry[2] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (document_id, entry[1], similarity)
+        return best
+
+    def add(
+        self, document_id: str, signature: np.ndarray, result_path: str, config_key: str
+    ) -> None:
+        """Index a document for this run's queries; ``save`` persists it."""
+        self._added[document_id] = (config_key, result_path, signature)
+        self._removed.discard(document_id)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets.setdefault((band, key), []).append(document_id)
+
+    def remove(self, document_id: str) -> None:
+        """Drop a document, e.g. one whose result could not be produced."""
+        self._added.pop(document_id, None)
+        self._removed.add(document_id)
+
+    def save(self) -> None:
+        """Write the entries and bucket markers of the documents added."""
+        for document_id, (config_key, result_path, signature) in self._added.items():
+            # The entry first, so every listed marker has one
+            self.storage.write_file(
+                self._entry_file(document_id),
+                {
+                    "config_key": config_key,
+                    "result_path": result_path,
+                    "signature": signature.tolist(),
+                    "parameters": self._parameters(),
+                },
+            )
+            for band, key in enumerate(self._band_keys(signature)):
+                self.storage.write_file(
+                    f"{self.bucket_folder}/{band}/{key.hex()}/{document_id}", b""
+                )
+        for document_id in self._removed:
+            # Buckets of a removed or replaced signature go stale; queries
+            # re-check entries
+            if self.storage.exists(self._entry_file(document_id)):
+                self.storage.write_file(self._entry_file(document_id), {})
+        self._added, self._buckets, self._removed = {}, {}, set()
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def _parameters(self) -> List[int]:
+        return [self.num_perm, self.shingle_size, self.seed]
+
+    def _entry_file(self, document_id: str) -> str:
+        return f"{self.index_folder}/documents/{document_id}.json"
+
+    def _read_entry(self, document_id: str) -> Optional[Tuple[str, str, np.ndarray]]:
+        entry_file = self._entry_file(document_id)
+        if not self.storage.exists(entry_file):
+            return None
+        entry = self.storage.read_json(entry_file)
+        # Removed, or signed with other MinHash parameters
+        if entry.get("parameters") != self._parameters():
+            return None
+        signature = np.array(entry["signature"], dtype=np.uint32)
+        return entry["config_key"], entry["result_path"], signature
@@ -0,0 +1,181 @@
+"""File-like objects streaming S3 objects in bounded pieces."""
+
+import io
+from typing import List, Optional
+
+# S3 rejects multipart parts below 5 MiB, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable reader fetching an S3 object with ranged GETs on demand.
+
+    Each request fetches at most ``max_range_bytes``; wrap the reader in an
+    ``io.BufferedReader`` to turn small reads into range-sized requests.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        max_range_bytes: int,
+        size: Optional[int] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.max_range_bytes = max_range_bytes
+        self.size = (
+            size
+            if size is not None
+            else client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        )
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+        return super().read(size)
+
+    def readall(self) -> bytes:
+        """Read up to the end in ranges of ``max_range_bytes``.
+
+        ``RawIOBase.readall`` would read in default-buffer-sized requests.
+        """
+        chunks = []
+        while self._position < self.size:
+            chunk = self._get_range(self.max_range_bytes)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size or not len(buffer):
+            return 0
+
+        data = self._get_range(min(len(buffer), self.max_range_bytes))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def _get_range(self, length: int) -> bytes:
+        end = min(self._position + length, self.size)
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={self._position}-{end - 1}",
+        )
+        data = response["Body"].read()
+        self._position += len(data)
+        return data
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Writer uploading to S3 without holding the whole object in memory.
+
+    Data is buffered until ``threshold_bytes``; smaller objects are sent with
+    a single PUT on ``close``. Larger ones switch to a multipart upload and
+    send a part every ``part_size_bytes``. ``abort`` discards the upload.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        part_size_bytes: int,
+        threshold_bytes: int,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size_bytes = max(part_size_bytes, MIN_PART_SIZE)
+        self.threshold_bytes = threshold_bytes
+        self._buffer = bytearray()
+        self._written = 0
+        self._upload_id: Optional[str] = None
+        self._parts: List[dict] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._written
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer.extend(data)
+        self._written += len(data)
+
+        if self._upload_id is None and len(self._buffer) >= self.threshold_bytes:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+        if self._upload_id is not None:
+            while len(self._buffer) >= self.part_size_bytes:
+                self._upload_part(self._buffer[: self.part_size_bytes])
+                del self._buffer[: self.part_size_bytes]
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)
+                )
+            else:
+                if self._buffer or not self._parts:
+                    self._upload_part(self._buffer)
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        super().close()
+
+    def abort(self) -> None:
+        """Discard everything written so far; nothing is stored."""
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def _upload_part(self, data) -> None:
+        part_number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
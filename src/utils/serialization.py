@@ -0,0 +1,145 @@
+"""Encodings of the intermediate documents written by the pipeline."""
+
+import gzip
+import io
+import json
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, BinaryIO, Collection, Dict, Iterator
+
+import msgpack
+import pyarrow as pa
+
+
+class OutputFormat(str, Enum):
+    """File format of an intermediate document, recognised by its suffix.
+
+    ``json`` is pretty-printed for readability; the other formats use compact
+    JSON (or msgpack) and compress it.
+    """
+
+    JSON = "json"
+    JSON_GZ = "json.gz"
+    JSON_ZST = "json.zst"
+    MSGPACK = "msgpack"
+
+    @property
+    def suffix(self) -> str:
+        return f".{self.value}"
+
+    @classmethod
+    def from_path(cls, path: str) -> "OutputFormat":
+        """Format of a file from its name, defaulting to plain JSON."""
+        # Longest suffix first so ".json.gz" is not taken for ".json"
+        for output_format in sorted(cls, key=lambda f: len(f.value), reverse=True):
+            if path.endswith(output_format.suffix):
+                return output_format
+        return cls.JSON
+
+
+def encode(content: Any, output_format: OutputFormat) -> bytes:
+    """Serialize ``content`` in ``output_format``."""
+    if output_format == OutputFormat.JSON:
+        return json.dumps(content, ensure_ascii=False, indent=2).encode("utf-8")
+    if output_format == OutputFormat.MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+
+    compact = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    data = compact.encode("utf-8")
+    if output_format == OutputFormat.JSON_GZ:
+        # Fixed mtime so identical content always hashes the same
+        return gzip.compress(data, mtime=0)
+    sink = pa.BufferOutputStream()
+    with pa.CompressedOutputStream(sink, "zstd") as stream:
+        stream.write(data)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_to(
+    sink: BinaryIO,
+    content: Dict[str, Any],
+    output_format: OutputFormat,
+    streamed_keys: Collection[str] = (),
+) -> None:
+    """Serialize ``content`` in ``output_format`` straight into ``sink``.
+
+    The values of ``streamed_keys`` may be iterables of text chunks instead of
+    strings; they are encoded chunk by chunk, so a large text is never held in
+    memory whole. The output decodes like ``encode``'s; msgpack needs string
+    lengths up front, so its chunks are joined first.
+    """
+    if output_format == OutputFormat.MSGPACK:
+        joined = {
+            key: "".join(value)
+            if key in streamed_keys and not isinstance(value, str)
+            else value
+            for key, value in content.items()
+        }
+        sink.write(encode(joined, output_format))
+        return
+
+    pretty = output_format == OutputFormat.JSON
+    with _compressed(sink, output_format) as stream:
+        for piece in _iter_json(content, streamed_keys, pretty):
+            stream.write(piece.encode("utf-8"))
+
+
+def decode(data: bytes, output_format: OutputFormat) -> Any:
+    """Deserialize content written by ``encode``."""
+    if output_format == OutputFormat.MSGPACK:
+        return msgpack.unpackb(data, raw=False)
+    if output_format == OutputFormat.JSON_GZ:
+        data = gzip.decompress(data)
+    elif output_format == OutputFormat.JSON_ZST:
+        with pa.CompressedInputStream(pa.BufferReader(data), "zstd") as stream:
+            data = stream.read()
+    return json.loads(data)
+
+
+def _iter_json(
+    content: Dict[str, Any], streamed_keys: Collection[str], pretty: bool
+) -> Iterator[str]:
+    """JSON text of ``content`` in pieces, formatted like ``json.dumps``."""
+    indent, separator = ("\n  ", ": ") if pretty else ("", ":")
+    yield "{"
+    for index, (key, value) in enumerate(content.items()):
+        yield ("," if index else "") + indent + json.dumps(key) + separator
+        if key in streamed_keys:
+            yield '"'
+            for chunk in [value] if isinstance(value, str) else value:
+                # Strip the quotes json.dumps puts around each chunk
+                yield json.dumps(chunk, ensure_ascii=False)[1:-1]
+            yield '"'
+        elif pretty:
+            yield json.dumps(value, ensure_ascii=False, indent=2).replace("\n", indent)
+        else:
+            yield json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    yield ("\n" if pretty and content else "") + "}"
+
+
+@contextmanager
+def _compressed(sink: BinaryIO, output_format: OutputFormat) -> Iterator[BinaryIO]:
+    """Wrap ``sink`` in the compressor of ``output_format``, leaving it open."""
+    if output_format == OutputFormat.JSON_GZ:
+        with gzip.GzipFile(fileobj=sink, mode="wb", mtime=0) as stream:
+            yield stream
+    elif output_format == OutputFormat.JSON_ZST:
+        with pa.CompressedOutputStream(
+            pa.PythonFile(_Unclosable(sink), mode="w"), "zstd"
+        ) as stream:
+            yield stream
+    else:
+        yield sink
+
+
+class _Unclosable(io.RawIOBase):
+    """Forwards writes to a stream without closing it when closed itself."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.stream.write(data)
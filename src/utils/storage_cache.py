@@ -0,0 +1,150 @@
+"""Local disk cache of S3 objects, validated by ETag."""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from dagster import get_dagster_logger
+
+logger = get_dagster_logger()
+
+# Copies handed out are not evicted for this long, so callers can still link,
+# copy or open them
+HANDOUT_GRACE_SECONDS = 60
+# Eviction frees space down to this fraction of the cap, so that a full cache
+# is not listed and sorted again on every add
+EVICTION_LOW_WATER = 0.9
+
+
+class StorageCache:
+    """Size-capped directory of local copies of S3 objects.
+
+    Each copy is stored under the object's key hash and its ETag, so a copy
+    is only served while the object in S3 still has the same ETag; a changed
+    object is simply fetched again and replaces the stale copy. Least recently
+    used copies are evicted once the cache exceeds ``max_size_bytes``, except
+    those returned in the last ``HANDOUT_GRACE_SECONDS``. Safe to use from
+    several threads.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        # Monotonic time each path was last returned by get or add
+        self._handed_out: Dict[Path, float] = {}
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size_bytes = sum(stat.st_size for stat, _ in self._stats())
+
+    def get(self, key: str, etag: str) -> Optional[Path]:
+        """Path of the cached copy of ``key`` at ``etag``, if there is one."""
+        path = self._path(key, etag)
+        with self._lock:
+            try:
+                # Refresh mtime so eviction is least-recently-used
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._handed_out[path] = time.monotonic()
+        return path
+
+    def temp_path(self) -> Path:
+        """A fresh path inside the cache to download or write a new copy to."""
+        return self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+
+    def add(self, key: str, etag: str, source: Path) -> Path:
+        """Move ``source`` into the cache as ``key`` at ``etag``.
+
+        ``source`` should come from ``temp_path`` so the move is a rename.
+        Copies of older ETags of the same key are removed.
+        """
+        path = self._path(key, etag)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for stale in path.parent.iterdir():
+                # A stale copy just handed out is left to eviction
+                if stale.name != path.name and stale not in self._recent():
+                    self._size_bytes -= self._remove(stale)
+
+            try:
+                previous_size = path.stat().st_size
+            except FileNotFoundError:
+                previous_size = 0
+            # Atomic, so a copy being linked or opened stays readable
+            os.replace(source, path)
+            self._size_bytes += path.stat().st_size - previous_size
+            self._handed_out[path] = time.monotonic()
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+        return path
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._size_bytes = 0
+            self._handed_out.clear()
+
+    def _evict(self) -> None:
+        """Remove least recently used copies down to the low-water mark.
+
+        Called with the lock held.
+        """
+        entries = sorted(self._stats(), key=lambda entry: entry[0].st_mtime)
+        self._size_bytes = sum(stat.st_size for stat, _ in entries)
+
+        recent = self._recent()
+        evicted = 0
+        for stat, path in entries:
+            if self._size_bytes <= self.max_size_bytes * EVICTION_LOW_WATER:
+                break
+            if path in recent:
+                continue
+            path.unlink(missing_ok=True)
+            self._size_bytes -= stat.st_size
+            evicted += 1
+
+        logger.info(f"Evicted {evicted} files from the storage cache {self.cache_dir}")
+
+    def _recent(self) -> Dict[Path, float]:
+        """Paths handed out within the grace period, dropping older ones."""
+        now = time.monotonic()
+        self._handed_out = {
+            path: at
+            for path, at in self._handed_out.items()
+            if now - at < HANDOUT_GRACE_SECONDS
+        }
+        return self._handed_out
+
+    def _stats(self):
+        """(stat, path) of every cached copy, skipping copies removed meanwhile."""
+        for path in self.cache_dir.glob("*/*/*"):
+            try:
+                yield path.stat(), path
+            except FileNotFoundError:
+                continue
+
+    def _remove(self, path: Path) -> int:
+        """Delete a copy, returning the bytes it freed."""
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return 0
+        path.unlink(missing_ok=True)
+        self._handed_out.pop(path, None)
+        return size
+
+    def _path(self, key: str, etag: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        # Fan out over sub-directories to keep directory listings small
+        return self.cache_dir / digest[:2] / digest / etag.strip('"')
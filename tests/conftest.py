@@ -0,0 +1,41 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.resources.storage import StorageResource, StorageType
+
+BUCKET = "test-bucket"
+REGION = "us-east-1"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """Mocked AWS account, with credentials that cannot reach a real one."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+    with mock_aws():
+        boto3.client("s3", region_name=REGION).create_bucket(Bucket=BUCKET)
+        yield
+
+
+@pytest.fixture
+def s3_storage(aws):
+    return StorageResource(
+        storage_type=StorageType.S3, s3_bucket_name=BUCKET, s3_region_name=REGION
+    )
+
+
+@pytest.fixture
+def count_calls():
+    """Record the parameters of every ``operation`` call made by a client."""
+
+    def register(client, operation: str) -> list:
+        calls = []
+        client.meta.events.register(
+            f"before-call.s3.{operation}",
+            lambda params, **kwargs: calls.append(params),
+        )
+        return calls
+
+    return register
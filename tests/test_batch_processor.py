@@ -0,0 +1,37 @@
+import asyncio
+
+from benchmarks.fake_openai import FakeOpenAIServer, fake_value
+from src.services.batch_processor import BatchLLMProcessor
+from src.services.structured_output_processor import build_llm_processor
+from src.utils.config_loader import load_prompt_config
+
+
+def test_batch_mode_end_to_end(monkeypatch):
+    prompt_config = load_prompt_config("s2_structured_info")
+    llm_config = prompt_config["paper_information_extraction"]
+    documents = [
+        ("first.pdf", "A paper about sparse attention."),
+        ("broken.pdf", "A paper the endpoint fails on: FAIL-THIS-REQUEST"),
+        ("last.pdf", "A paper about state space models."),
+    ]
+
+    with FakeOpenAIServer(
+        failing_marker="FAIL-THIS-REQUEST", batch_in_progress_polls=2
+    ) as server:
+        monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", server.url)
+        monkeypatch.setenv("AZURE_OPENAI_API_KEY", "test")
+        processor = BatchLLMProcessor(
+            build_llm_processor(llm_config), poll_interval_seconds=0
+        )
+        results = asyncio.run(processor.extract_all(iter(documents)))
+
+    assert server.requests == 3
+    # Polled until the batch stopped being reported in progress
+    assert list(server.batch_polls.values()) == [3]
+    expected = fake_value(llm_config["response_format"]["json_schema"]["schema"])
+    assert results["first.pdf"] == expected
+    assert results["last.pdf"] == expected
+    # Results are mapped back by custom_id, in submission order
+    assert isinstance(results["broken.pdf"], RuntimeError)
+    assert "request-1 failed" in str(results["broken.pdf"])
+    assert "Injected failure" in str(results["broken.pdf"])
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.resources.storage import StorageResource, StorageType
+from src.utils.checkpoint import ResultCheckpoint
+
+
+def reference(path: str) -> dict:
+    return {"filename": path, "path": path, "sha256": "result", "size_bytes": 2}
+
+
+def test_entries_are_per_document_and_survive_concurrent_runs(tmp_path):
+    storage = StorageResource(
+        storage_type=StorageType.LOCAL, local_base_path=str(tmp_path)
+    )
+    runs = [ResultCheckpoint(storage, "out/_checkpoint") for _ in range(4)]
+
+    def finish(index: int) -> None:
+        path = f"out/doc-{index}_structured.json"
+        storage.write_file(path, "{}")
+        runs[index % 4].record(f"doc-{index}.pdf", "source", "config", reference(path))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(finish, range(40)))
+
+    # A later run sees what every earlier run recorded
+    resumed = ResultCheckpoint(storage, "out/_checkpoint")
+    for index in range(40):
+        assert resumed.get(f"doc-{index}.pdf", "source", "config") == reference(
+            f"out/doc-{index}_structured.json"
+        )
+    assert len(storage.list_files("out/_checkpoint", ".json")) == 40
+
+    # Only reused for the same input and prompt, while the result exists
+    assert resumed.get("doc-0.pdf", "changed", "config") is None
+    assert resumed.get("doc-0.pdf", "source", "other prompt") is None
+    (tmp_path / "out" / "doc-0_structured.json").unlink()
+    assert resumed.get("doc-0.pdf", "source", "config") is None
+    assert resumed.get("never-seen.pdf", "source", "config") is None
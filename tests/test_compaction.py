@@ -0,0 +1,72 @@
+import os
+from datetime import timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.jobs import staging_compaction_job
+from src.resources.storage import StorageResource, StorageType
+from src.utils.compaction import compact_partitions
+
+FOLDER = "s3_staging/documents"
+
+
+def stage(storage, path: str, **columns) -> None:
+    storage.write_parquet(f"{FOLDER}/{path}", pa.table(columns))
+
+
+def rows(storage, folder: str):
+    paths = storage.list_files(folder, ".parquet")
+    tables = []
+    for path in paths:
+        with storage.open_read(path) as f:
+            tables.append(pq.read_table(f))
+    return paths, pa.concat_tables(tables).sort_by("document_id").to_pylist()
+
+
+def test_each_load_date_is_merged_into_one_file(s3_storage):
+    stage(s3_storage, "load_date=2025-01-01/run-1.parquet", document_id=["a"])
+    stage(s3_storage, "load_date=2025-01-01/run-2.parquet", document_id=["b"])
+    # Staged after a column was added
+    stage(
+        s3_storage,
+        "load_date=2025-01-01/run-3.parquet",
+        document_id=["c"],
+        title=["Title"],
+    )
+    stage(s3_storage, "load_date=2025-01-02/run-4.parquet", document_id=["d"])
+
+    merged = compact_partitions(s3_storage, FOLDER, min_age=timedelta(0))
+
+    assert merged == {f"{FOLDER}/load_date=2025-01-01": 3}
+    paths, merged_rows = rows(s3_storage, f"{FOLDER}/load_date=2025-01-01")
+    assert len(paths) == 1 and "/compacted-" in paths[0]
+    assert merged_rows == [
+        {"document_id": "a", "title": None},
+        {"document_id": "b", "title": None},
+        {"document_id": "c", "title": "Title"},
+    ]
+    assert len(s3_storage.list_files(f"{FOLDER}/load_date=2025-01-02")) == 1
+
+
+def test_files_of_running_loads_are_left_alone(tmp_path):
+    storage = StorageResource(
+        storage_type=StorageType.LOCAL, local_base_path=str(tmp_path)
+    )
+    for run in range(3):
+        stage(storage, f"load_date=2025-01-01/run-{run}.parquet", document_id=[run])
+    for run in range(2):
+        old = tmp_path / FOLDER / f"load_date=2025-01-01/run-{run}.parquet"
+        os.utime(old, (1_000_000, 1_000_000))
+
+    result = staging_compaction_job.execute_in_process(
+        resources={"storage": storage}
+    )
+
+    assert result.success
+    paths, merged_rows = rows(storage, FOLDER)
+    assert sorted(path.rsplit("/", 1)[1][:10] for path in paths) == [
+        "compacted-",
+        "run-2.parq",
+    ]
+    assert merged_rows == [{"document_id": run} for run in range(3)]
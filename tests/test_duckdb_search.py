@@ -0,0 +1,98 @@
+import dagster as dg
+import pandas as pd
+import pytest
+
+from src.jobs import search_index_job, search_index_schedule
+from src.resources.duckdb import DuckDBResource
+
+SCHEMA = {
+    "document_id": "VARCHAR",
+    "title": "VARCHAR",
+    "abstract": "TEXT",
+    "authors": "JSON",
+    "keywords": "JSON",
+}
+
+
+@pytest.fixture
+def resource(tmp_path):
+    return DuckDBResource(path=str(tmp_path / "db" / "documents.duckdb"))
+
+
+@pytest.fixture
+def db(resource):
+    with resource.yield_for_execution(dg.build_init_resource_context()) as db:
+        db.ensure_table("documents", SCHEMA, primary_key="document_id")
+        yield db
+
+
+def load(db, *rows) -> None:
+    db.upsert_dataframe(
+        "documents", pd.DataFrame(rows, columns=list(SCHEMA)), key="document_id"
+    )
+
+
+def test_side_tables_skip_values_that_are_not_lists(db):
+    load(
+        db,
+        ("a", "Sparse attention", "", '["Ada Lovelace", " "]', '["NLP"]'),
+        ("b", "Scalars", "", '"notalist"', "{}"),
+        ("c", "Nothing", "", None, "null"),
+    )
+
+    assert db.refresh_search_index("documents") is False
+    assert db.execute_and_fetch(
+        "SELECT * FROM documents_authors ORDER BY author"
+    ) == [
+        {
+            "document_id": "a",
+            "author": "Ada Lovelace",
+            "author_normalized": "ada lovelace",
+        }
+    ]
+
+    load(db, ("b", "Scalars", "", '["Grace Hopper"]', '["nlp"]'))
+    db.refresh_search_index("documents", document_ids=["b"])
+    found = db.search_documents("documents", keyword="NLP")
+    assert [row["document_id"] for row in found] == ["a", "b"]
+
+
+def test_full_text_index_is_rebuilt_by_its_own_job(db, resource):
+    if not db._try_load_fts():
+        pytest.skip("fts extension unavailable")
+    load(
+        db,
+        ("a", "Sparse attention", "", "[]", "[]"),
+        ("b", "State space models", "", "[]", "[]"),
+    )
+    db.refresh_search_index("documents")
+    # Per-document loads leave the full-text index alone
+    assert not db._has_fts_index("documents")
+    db.close()
+
+    result = search_index_job.execute_in_process(resources={"duckdb": resource})
+
+    assert result.success
+    with resource.yield_for_execution(dg.build_init_resource_context()) as db:
+        assert db._has_fts_index("documents")
+        found = db.search_documents("documents", "attention")
+        assert [row["document_id"] for row in found] == ["a"]
+
+
+def test_search_index_schedule_skips_when_nothing_was_loaded(resource):
+    with dg.instance_for_test() as instance:
+
+        def evaluate():
+            return search_index_schedule(dg.build_schedule_context(instance))
+
+        assert isinstance(evaluate(), dg.SkipReason)
+
+        instance.report_runless_asset_event(
+            dg.AssetMaterialization("load_to_database", partition="a")
+        )
+        assert isinstance(evaluate(), dg.RunRequest)
+
+        search_index_job.execute_in_process(
+            instance=instance, resources={"duckdb": resource}
+        )
+        assert isinstance(evaluate(), dg.SkipReason)
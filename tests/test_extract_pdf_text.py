@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import dagster as dg
+
+from src.assets.s1_extract_pdf_text import (
+    DOCUMENT_PATH_TAG,
+    PDFExtractionConfig,
+    _find_pdfs,
+)
+
+
+def context(tags=None):
+    return SimpleNamespace(
+        run=SimpleNamespace(tags=tags or {}), log=dg.get_dagster_logger()
+    )
+
+
+def test_partition_pdfs_are_found_without_listing(s3_storage, count_calls):
+    for key in ("raw/top.pdf", "raw/sub/nested.pdf", "raw/sub/other.pdf"):
+        s3_storage.s3_client.put_object(
+            Bucket=s3_storage.s3_bucket_name, Key=key, Body=b"pdf"
+        )
+    lists = count_calls(s3_storage.s3_client, "ListObjectsV2")
+    config = PDFExtractionConfig()
+
+    top = _find_pdfs(context(), config, s3_storage, {"top"})
+    tagged = _find_pdfs(
+        context({DOCUMENT_PATH_TAG: "raw/sub/nested.pdf"}),
+        config,
+        s3_storage,
+        {"nested"},
+    )
+    assert [info.path for info in top] == ["raw/top.pdf"]
+    assert [info.path for info in tagged] == ["raw/sub/nested.pdf"]
+    assert tagged[0].etag and tagged[0].size_bytes == 3
+    assert lists == []
+
+    # A backfill of nested PDFs falls back to listing the input folder
+    listed = _find_pdfs(context(), config, s3_storage, {"nested", "other", "gone"})
+    assert [info.path for info in listed] == [
+        "raw/sub/nested.pdf",
+        "raw/sub/other.pdf",
+    ]
+    assert len(lists) == 1
@@ -0,0 +1,19 @@
+from src.services.llm_cache import LLMResponseCache
+
+
+def test_eviction_frees_space_below_the_cap(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path), max_size_bytes=100_000)
+    evictions = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: evictions.append(evict()))
+
+    for index in range(150):
+        cache.set(f"{index:064x}", "x" * 990)
+
+    on_disk = sum(path.stat().st_size for path in cache._entries())
+    assert cache._size_bytes == on_disk <= 100_000
+    # Each eviction makes room for about a tenth of the cap, ten entries here,
+    # rather than listing the cache again on every write once full
+    assert 1 <= len(evictions) <= 8
+    assert cache.get(f"{149:064x}") == "x" * 990
+    assert cache.get(f"{0:064x}") is None
@@ -0,0 +1,57 @@
+import os
+
+from src.resources.storage import StorageResource, StorageType
+from src.utils.manifest import ExtractionManifest
+
+
+def test_entries_are_per_file_and_survive_concurrent_runs(tmp_path):
+    storage = StorageResource(
+        storage_type=StorageType.LOCAL, local_base_path=str(tmp_path)
+    )
+    for name in ("a.pdf", "sub/b.pdf"):
+        (tmp_path / "raw" / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / "raw" / name).write_bytes(name.encode())
+    infos = {
+        info.path.removeprefix("raw/"): info
+        for info in storage.iter_files("raw", ".pdf")
+    }
+
+    first = ExtractionManifest(storage, "out/_manifest")
+    second = ExtractionManifest(storage, "out/_manifest")
+    assert first.get("a.pdf") is None
+    first.record("a.pdf", infos["a.pdf"], tmp_path / "raw/a.pdf", {"path": "a"})
+    second.record("sub/b.pdf", infos["sub/b.pdf"], tmp_path / "raw/sub/b.pdf")
+
+    later = ExtractionManifest(storage, "out/_manifest")
+    assert later.get("a.pdf")["reference"] == {"path": "a"}
+    assert all(later.is_unchanged(key, info) for key, info in infos.items())
+
+    # Re-copied with the same content: still unchanged, and remembered
+    os.utime(tmp_path / "raw/a.pdf", (2_000_000, 2_000_000))
+    touched = next(storage.iter_files("raw", "a.pdf"))
+    assert not later.is_unchanged("a.pdf", touched)
+    assert later.is_unchanged("a.pdf", touched, tmp_path / "raw/a.pdf")
+    assert ExtractionManifest(storage, "out/_manifest").is_unchanged(
+        "a.pdf", touched
+    )
+
+
+def test_files_extracted_with_other_settings_are_changed(tmp_path):
+    storage = StorageResource(
+        storage_type=StorageType.LOCAL, local_base_path=str(tmp_path)
+    )
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw/a.pdf").write_bytes(b"pdf")
+    info = next(storage.iter_files("raw", ".pdf"))
+    tiered = {"strategy": "tiered", "pages_per_task": 50}
+
+    ExtractionManifest(storage, "out/_manifest", tiered).record(
+        "a.pdf", info, tmp_path / "raw/a.pdf"
+    )
+
+    assert ExtractionManifest(storage, "out/_manifest", tiered).is_unchanged(
+        "a.pdf", info
+    )
+    assert not ExtractionManifest(
+        storage, "out/_manifest", {**tiered, "strategy": "hi_res"}
+    ).is_unchanged("a.pdf", info)
@@ -0,0 +1,67 @@
+import random
+
+from src.utils.near_duplicates import NearDuplicateIndex
+
+WORDS = [f"word{index}" for index in range(2000)]
+
+
+def text(seed: int, length: int = 400) -> str:
+    return " ".join(random.Random(seed).choices(WORDS, k=length))
+
+
+def edited(original: str) -> str:
+    words = original.split()
+    words[200] = "edited"
+    return " ".join(words)
+
+
+def index_documents(storage, count: int) -> None:
+    index = NearDuplicateIndex(storage, "out/_index")
+    for seed in range(count):
+        signature = index.signature(text(seed))
+        index.add(f"doc-{seed}.pdf", signature, f"out/doc-{seed}.json", "config")
+    index.save()
+
+
+def test_queries_only_read_their_own_buckets(s3_storage, count_calls):
+    index_documents(s3_storage, 40)
+    index = NearDuplicateIndex(s3_storage, "out/_index")
+    lists = count_calls(s3_storage.s3_client, "ListObjectsV2")
+    gets = count_calls(s3_storage.s3_client, "GetObject")
+
+    match = index.query(index.signature(edited(text(7))), "config")
+
+    assert match[:2] == ("doc-7.pdf", "out/doc-7.json")
+    assert match[2] >= 0.9
+    assert len(lists) == index.bands
+    # Only the candidate's entry is read, not the index of the corpus
+    assert len(gets) == 1
+    assert gets[0]["url_path"].endswith("/out/_index/documents/doc-7.pdf.json")
+
+
+def test_runs_add_documents_without_rewriting_each_other(s3_storage):
+    first = NearDuplicateIndex(s3_storage, "out/_index")
+    second = NearDuplicateIndex(s3_storage, "out/_index")
+    first.add("a.pdf", first.signature(text(1)), "out/a.json", "config")
+    second.add("b.pdf", second.signature(text(2)), "out/b.json", "config")
+    first.save()
+    second.save()
+
+    later = NearDuplicateIndex(s3_storage, "out/_index")
+    assert later.query(later.signature(text(1)), "config")[0] == "a.pdf"
+    assert later.query(later.signature(text(2)), "config")[0] == "b.pdf"
+    assert later.query(later.signature(text(2)), "other prompt") is None
+    assert later.query(later.signature(text(3)), "config") is None
+
+    later.remove("a.pdf")
+    later.save()
+    final = NearDuplicateIndex(s3_storage, "out/_index")
+    assert final.query(final.signature(text(1)), "config") is None
+
+
+def test_documents_added_in_the_run_are_found_before_saving(s3_storage):
+    index = NearDuplicateIndex(s3_storage, "out/_index")
+    index.add("a.pdf", index.signature(text(1)), "out/a.json", "config")
+
+    assert index.query(index.signature(edited(text(1))), "config")[0] == "a.pdf"
+    assert index.query(index.signature(text(1)), "config", exclude="a.pdf") is None
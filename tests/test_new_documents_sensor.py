@@ -0,0 +1,68 @@
+import os
+
+import dagster as dg
+import pytest
+
+from src.assets.s1_extract_pdf_text import DOCUMENT_PATH_TAG
+from src.partitions import documents_partitions
+from src.resources.storage import StorageResource, StorageType
+from src.sensors.new_documents import new_documents_sensor
+
+
+@pytest.fixture
+def instance():
+    with dg.instance_for_test() as instance:
+        yield instance
+
+
+def evaluate(instance, storage, cursor=None):
+    context = dg.build_sensor_context(
+        instance=instance, cursor=cursor, resources={"storage": storage}
+    )
+    result = new_documents_sensor(context)
+    for request in result.dynamic_partitions_requests or []:
+        instance.add_dynamic_partitions(
+            documents_partitions.name, list(request.partition_keys)
+        )
+    return result
+
+
+def write_pdf(base, path: str, content: bytes, mtime: float) -> None:
+    full_path = base / "raw" / path
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    full_path.write_bytes(content)
+    os.utime(full_path, (mtime, mtime))
+
+
+def test_replaced_pdfs_run_again_and_duplicate_stems_are_skipped(
+    tmp_path, instance
+):
+    storage = StorageResource(
+        storage_type=StorageType.LOCAL, local_base_path=str(tmp_path)
+    )
+    write_pdf(tmp_path, "paper.pdf", b"v1", 1_000_000)
+    write_pdf(tmp_path, "a/twin.pdf", b"a", 1_000_000)
+    write_pdf(tmp_path, "b/twin.pdf", b"b", 1_000_000)
+
+    first = evaluate(instance, storage)
+    assert [r.partition_key for r in first.run_requests] == ["paper"]
+    assert first.run_requests[0].tags[DOCUMENT_PATH_TAG] == "raw/paper.pdf"
+    assert instance.get_dynamic_partitions(documents_partitions.name) == ["paper"]
+
+    unchanged = evaluate(instance, storage, first.cursor)
+    assert unchanged.run_requests == []
+    assert unchanged.skip_reason is not None
+
+    write_pdf(tmp_path, "paper.pdf", b"v2 replaced", 2_000_000)
+    replaced = evaluate(instance, storage, unchanged.cursor)
+    assert [r.partition_key for r in replaced.run_requests] == ["paper"]
+    assert replaced.run_requests[0].run_key != first.run_requests[0].run_key
+
+    # Arrived later, but with the same modification time as the last one seen
+    write_pdf(tmp_path, "late.pdf", b"late", 2_000_000)
+    late = evaluate(instance, storage, replaced.cursor)
+    assert [r.partition_key for r in late.run_requests] == ["late"]
+
+    later = evaluate(instance, storage, late.cursor)
+    assert later.run_requests == []
+    assert later.skip_reason is not None
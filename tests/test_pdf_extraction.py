@@ -0,0 +1,133 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from benchmarks.synthetic_corpus import write_pdf
+from src.services import pdf_extraction
+from src.services.pdf_extraction import extract_pdfs, resolve_worker_count
+
+
+def record_worker(worker_dir, function, *args):
+    # Runs in the worker: leaves a file named after its process
+    (worker_dir / str(os.getpid())).touch()
+    return function(*args)
+
+
+class Pools:
+    """Pools created by ``extract_pdfs``, the tasks and the workers they used."""
+
+    def __init__(self, worker_dir):
+        self.worker_dir = worker_dir
+        self.sizes = []
+        self.submitted = 0
+
+    @property
+    def workers(self) -> int:
+        return len(list(self.worker_dir.iterdir()))
+
+
+@pytest.fixture
+def pools(tmp_path, monkeypatch):
+    worker_dir = tmp_path / "workers"
+    worker_dir.mkdir()
+    recorded = Pools(worker_dir)
+
+    class RecordingExecutor(ProcessPoolExecutor):
+        def __init__(self, max_workers=None, **kwargs):
+            recorded.sizes.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+
+        def submit(self, function, *args):
+            recorded.submitted += 1
+            return super().submit(record_worker, worker_dir, function, *args)
+
+    monkeypatch.setattr(pdf_extraction, "ProcessPoolExecutor", RecordingExecutor)
+    return recorded
+
+
+def pdfs(tmp_path, *page_counts):
+    rng = random.Random(0)
+    paths = []
+    for index, page_count in enumerate(page_counts):
+        path = tmp_path / f"doc-{index}.pdf"
+        write_pdf(path, page_count, rng)
+        paths.append(path)
+    return paths
+
+
+def test_workers_are_capped_by_the_page_range_tasks(tmp_path, pools):
+    max_workers = resolve_worker_count(8, file_count=1, split_pages=True)
+    assert max_workers == 8
+
+    # Three ranges of a single split PDF
+    results = list(
+        extract_pdfs(
+            iter(pdfs(tmp_path, 5)), max_workers, batch_size=10, pages_per_task=2
+        )
+    )
+
+    assert pools.submitted == 3
+    assert 1 <= pools.workers <= 3
+    assert [error for _, _, error in results] == [None]
+    assert results[0][1]["metadata"]["page_count"] == 5
+
+
+def test_a_single_unsplit_task_runs_in_process(tmp_path, pools):
+    results = list(
+        extract_pdfs(iter(pdfs(tmp_path, 2)), 8, batch_size=10, pages_per_task=4)
+    )
+
+    assert pools.sizes == []
+    assert [error for _, _, error in results] == [None]
+
+
+def test_files_are_submitted_while_later_ones_arrive(tmp_path, pools):
+    files = pdfs(tmp_path, 1, 1, 1, 1, 1, 1)
+    submitted_before = []
+
+    def arriving():
+        # Like PDFPrefetcher, a file is only handed over once downloaded
+        for path in files:
+            submitted_before.append(pools.submitted)
+            yield path
+
+    results = list(extract_pdfs(arriving(), 4, batch_size=1))
+
+    assert pools.sizes == [4]
+    assert len(results) == 6
+    # Only the second file is awaited before the first is submitted, not a
+    # file for every worker
+    assert submitted_before[2] >= 1
+
+
+def crash_on_marker(function, pdf_path, *args):
+    # Runs in the worker: dies like a worker killed for its memory
+    if "crash" in pdf_path:
+        os._exit(1)
+    return function(pdf_path, *args)
+
+
+def test_a_dead_worker_only_fails_the_files_in_flight(
+    tmp_path, monkeypatch, pools
+):
+    executor_class = pdf_extraction.ProcessPoolExecutor
+
+    class CrashingExecutor(executor_class):
+        def submit(self, function, *args):
+            return super().submit(crash_on_marker, function, *args)
+
+    monkeypatch.setattr(pdf_extraction, "ProcessPoolExecutor", CrashingExecutor)
+    files = pdfs(tmp_path, 1, 1, 1, 1, 1, 1)
+    files[1] = files[1].rename(tmp_path / "crash.pdf")
+
+    results = list(extract_pdfs(iter(files), 2, batch_size=1))
+
+    errors = {path.name: error for path, _, error in results}
+    assert sorted(errors) == sorted(path.name for path in files)
+    assert isinstance(errors["crash.pdf"], BrokenProcessPool)
+    # Files submitted after the crash went to a new pool
+    assert errors["doc-4.pdf"] is None and errors["doc-5.pdf"] is None
+    assert len(pools.sizes) >= 2
@@ -0,0 +1,33 @@
+import os
+
+from src.utils.s3_io import S3RangeReader
+
+MB = 1024 * 1024
+
+
+def test_read_fetches_whole_ranges(s3_storage, count_calls):
+    data = os.urandom(12 * MB)
+    s3_storage.s3_client.put_object(
+        Bucket=s3_storage.s3_bucket_name, Key="big.bin", Body=data
+    )
+    gets = count_calls(s3_storage.s3_client, "GetObject")
+
+    with s3_storage.read_file("big.bin") as f:
+        assert f.read() == data
+
+    # 8 MB ranges (s3_multipart_chunksize_mb) rather than 8 KB reads
+    assert len(gets) == 2
+
+
+def test_readall_from_position(s3_storage, count_calls):
+    data = bytes(range(256)) * 100
+    client, bucket = s3_storage.s3_client, s3_storage.s3_bucket_name
+    client.put_object(Bucket=bucket, Key="small.bin", Body=data)
+    reader = S3RangeReader(client, bucket, "small.bin", 1000)
+    gets = count_calls(client, "GetObject")
+
+    reader.seek(500)
+    assert reader.read() == data[500:]
+    # 25,100 bytes left in ranges of 1,000
+    assert len(gets) == 26
+    assert reader.read() == b""
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def put(storage, key: str, body: bytes = b"x") -> None:
+    storage.s3_client.put_object(Bucket=storage.s3_bucket_name, Key=key, Body=body)
+
+
+def test_s3_client_is_shared_across_threads(s3_storage):
+    barrier = threading.Barrier(8)
+
+    def client():
+        barrier.wait()
+        return s3_storage.s3_client
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda _: client(), range(8)))
+
+    assert all(c is clients[0] for c in clients)
+    assert clients[0].meta.config.max_pool_connections == 32
+    assert clients[0].meta.config.retries["mode"] == "adaptive"
+
+
+@pytest.fixture
+def listed_storage(s3_storage):
+    # Above the 1,000 keys of a single ListObjectsV2 page
+    keys = [
+        f"raw/{prefix}/doc-{index:04d}.pdf" for prefix in "ab" for index in range(600)
+    ]
+    keys += ["raw/top.pdf", "raw/notes.txt"]
+    for key in keys:
+        put(s3_storage, key)
+    return s3_storage, {key for key in keys if key.endswith(".pdf")}
+
+
+def test_iter_files_pages_through_listing(listed_storage, count_calls):
+    storage, expected = listed_storage
+    lists = count_calls(storage.s3_client, "ListObjectsV2")
+
+    infos = list(storage.iter_files("raw", ".pdf"))
+
+    assert {info.path for info in infos} == expected
+    assert len(infos) == len(expected)
+    assert all(info.etag and info.size_bytes == 1 for info in infos)
+    assert len(lists) == 2
+
+
+def test_iter_files_lists_sub_prefixes_in_parallel(listed_storage, count_calls):
+    storage, expected = listed_storage
+    lists = count_calls(storage.s3_client, "ListObjectsV2")
+
+    infos = list(storage.iter_files("raw", ".pdf", max_workers=4))
+
+    assert {info.path for info in infos} == expected
+    assert len(infos) == len(expected)
+    # The delimited top level, then one page per 600-key sub-prefix
+    assert sorted(call["query_string"]["prefix"] for call in lists) == [
+        "raw/",
+        "raw/a/",
+        "raw/b/",
+    ]
+
+
+def test_concurrent_reads_and_writes(s3_storage):
+    def roundtrip(index: int):
+        path = f"out/doc-{index}.json"
+        s3_storage.write_file(path, f'{{"index": {index}}}')
+        return s3_storage.read_json(path)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(roundtrip, range(64)))
+
+    assert results == [{"index": index} for index in range(64)]
+    assert len(s3_storage.list_files("out", ".json")) == 64
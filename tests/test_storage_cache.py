@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.storage_cache import StorageCache
+
+
+def add(cache: StorageCache, key: str, etag: str, size: int):
+    source = cache.temp_path()
+    source.write_bytes(os.urandom(size))
+    return cache.add(key, etag, source)
+
+
+def disk_size(cache: StorageCache) -> int:
+    return sum(stat.st_size for stat, _ in cache._stats())
+
+
+def test_concurrent_adds_keep_the_size_accounted(tmp_path):
+    cache = StorageCache(str(tmp_path), max_size_bytes=64 * 1024)
+
+    def worker(index: int):
+        for version in range(5):
+            path = add(cache, f"key-{index % 16}", f"etag-{version}", 4096)
+            cache.get(f"key-{index % 16}", f"etag-{version}")
+            assert path.exists()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(worker, range(64)))
+
+    assert cache._size_bytes == disk_size(cache)
+
+
+def test_handed_out_copies_are_not_evicted(tmp_path):
+    cache = StorageCache(str(tmp_path), max_size_bytes=10_000)
+    first = add(cache, "first", "a", 6000)
+    assert cache.get("first", "a") == first
+
+    second = add(cache, "second", "a", 6000)
+
+    # Over the cap, but both were just handed out
+    assert first.exists() and second.exists()
+    cache._handed_out.clear()
+    add(cache, "third", "a", 1000)
+    # The least recently used copy goes once it may
+    assert not first.exists() and second.exists()
+    assert cache._size_bytes == disk_size(cache) == 7000
+
+
+def test_eviction_skips_copies_removed_meanwhile(tmp_path):
+    cache = StorageCache(str(tmp_path), max_size_bytes=10_000)
+    gone = add(cache, "gone", "a", 4000)
+    cache._handed_out.clear()
+    gone.unlink()
+
+    add(cache, "big", "a", 9000)
+    add(cache, "bigger", "a", 9000)
+
+    assert cache._size_bytes == disk_size(cache)
+
+
+def test_eviction_frees_space_below_the_cap(tmp_path, monkeypatch):
+    cache = StorageCache(str(tmp_path), max_size_bytes=100_000)
+    evictions = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: evictions.append(evict()))
+
+    for index in range(150):
+        add(cache, f"key-{index}", "a", 1000)
+        cache._handed_out.clear()
+
+    assert cache._size_bytes == disk_size(cache) <= 100_000
+    # Room for ten more copies after each eviction, not one
+    assert 1 <= len(evictions) <= 8